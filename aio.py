@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+asyncio support for a python progress bar
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+"""
+
+import asyncio
+import re
+
+from progress import ProgressBar
+
+_PARTIAL_RE = re.compile(r'\r\033\[\d*[CK]')   # incremental fragments and messages, anything else after \r is a full frame
+_MAX_QUEUED = 64                                # fragments held back before they are given up for a full redraw
+
+class AsyncProgressBar(ProgressBar):
+    def __init__(self, n_iterations: int, **kwargs) -> None:
+        """
+        Progress bar for coroutines, updates only count and a task on the event loop draws the bar
+        ---
+        params:
+            - n_iterations: [int] total number of iterations to be processed
+            - kwargs: any other ProgressBar parameter, refresh sets the number of seconds between two redraws
+        ---
+        usage:
+            async with AsyncProgressBar(n) as bar:
+                async for item in bar.wrap(source): ...
+                results = await bar.gather(*coroutines)
+                for next_done in bar.as_completed(tasks): result = await next_done
+        """
+        kwargs['render'] = 'inline'     # drawing is driven by the event loop instead of a thread
+        super().__init__(n_iterations, **kwargs)
+        self._update = self._count      # calling bar() from a coroutine only counts
+        self._task = None               # render task on the event loop
+        self._writing = None            # write that is in flight in the default executor
+        self._queued = []               # output that arrived while the terminal was busy
+
+    async def __aenter__(self) -> 'AsyncProgressBar':
+        self._start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Stop the render task, draw the final frame and wait until everything is written"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if not self._finished:
+            self._refresh(force=True)
+            if not self.done:       # interrupted before completion, release the line
+                self._write('\n')
+        while self._writing is not None and not self._writing.done():
+            await asyncio.wait([self._writing])     # its done callback may have started the queued frame
+        self._finalize()
+
+    async def wrap(self, aiterable):
+        """Iterate over an async iterable, advancing the bar for every item"""
+        self._start()
+        async for item in aiterable:
+            yield item
+            self.i += 1
+
+    async def gather(self, *aws, return_exceptions: bool = False) -> list:
+        """Like asyncio.gather, advancing the bar whenever one of the awaitables completes"""
+        self._start()
+        return await asyncio.gather(*(self._track(aw) for aw in aws), return_exceptions=return_exceptions)
+
+    def as_completed(self, aws):
+        """Like asyncio.as_completed, advancing the bar whenever one of the awaitables completes"""
+        self._start()
+        for next_done in asyncio.as_completed(aws):
+            yield self._track(next_done)
+
+    async def _track(self, aw):
+        """Await aw and count it as one iteration"""
+        result = await aw
+        self.i += 1
+        return result
+
+    def _start(self) -> None:
+        """Schedule the render task on the running loop, once"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._tick())
+
+    async def _tick(self) -> None:
+        """Redraw the bar every refresh seconds until it is complete"""
+        while not self._finished:
+            await asyncio.sleep(self.refresh)
+            self._refresh()
+
+    def _write(self, text: str) -> None:
+        """Hand text to a worker thread so a slow terminal never blocks the event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:                        # no loop (anymore), write directly
+            return super()._write(text)
+        if self._writing is not None and not self._writing.done():
+            if text.startswith('\r') and not _PARTIAL_RE.match(text):
+                # a full frame redraws the whole line, queued frames and fragments are outdated, messages are not
+                self._queued = [queued for queued in self._queued if queued.endswith('\n')]
+            elif len(self._queued) >= _MAX_QUEUED:
+                self._queued = [queued for queued in self._queued if queued.endswith('\n')]
+                self.invalidate()                   # fragments given up, the next frame is drawn in full
+                if not text.endswith('\n'):
+                    return
+            self._queued.append(text)
+            return
+        self._writing = loop.run_in_executor(None, super()._write, text)
+        self._writing.add_done_callback(self._write_queued)
+
+    def _write_queued(self, _) -> None:
+        """Write the output that was queued while the previous write was in flight, in one go"""
+        if self._queued:
+            text = ''.join(self._queued)
+            self._queued = []
+            self._write(text)
+
+
+if __name__ == '__main__':
+    print('Do not run this file directly.')
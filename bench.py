@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+microbenchmarks for a python progress bar
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+---
+usage:
+    python bench.py                             # print results
+    python bench.py --save baseline.json        # store results as a baseline
+    python bench.py --compare baseline.json     # flag regressions of the fastest run against a baseline (exit code 1)
+budgets for import and construction time are in BUDGETS, exceeding one also gives exit code 1, the import time
+is only checked against its budget, it is too noisy to compare
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter_ns
+
+from progress import ProgressBar
+from spinner import Spinner
+from style import Style
+
+# upper limits in nanoseconds per operation, exceeding one fails the run like a regression does
+BUDGETS = {
+    'import/progress': 50_000_000,
+    'construct/ProgressBar': 10_000,
+    'construct/ProgressBar_colored': 10_000,
+    'construct/ProgressBar_minimal': 10_000,
+}
+
+def measure(fn, number: int, repeat: int) -> dict:
+    """
+    Time fn() and report nanoseconds per operation over a number of repeated runs
+    ---
+    params:
+        - fn: [callable] takes no arguments, prepares a run and returns a function that performs number operations
+        - number: [int] operations per run
+        - repeat: [int] number of runs
+    ---
+    every run is followed by a run of the reference loop, the ratio of their fastest runs (relative) hardly
+    moves when the whole machine gets faster or slower between two invocations
+    """
+    timings = []
+    references = []
+    enabled = gc.isenabled()
+    for _ in range(repeat):
+        operate = fn()                      # setup is not timed
+        gc.disable()                        # like timeit, a collection would land in a random run
+        try:
+            start = perf_counter_ns()
+            operate()
+            timings.append((perf_counter_ns() - start) / number)
+            start = perf_counter_ns()
+            _reference(number)
+            references.append((perf_counter_ns() - start) / number)
+        finally:
+            if enabled:
+                gc.enable()
+    return {
+        'min': min(timings),
+        'relative': min(timings) / min(references),
+        'relative_stdev': statistics.stdev(t / r for t, r in zip(timings, references)) if repeat > 1 else 0.,
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if repeat > 1 else 0.,
+        'repeat': repeat,
+        'number': number,
+    }
+
+def _noop() -> None:
+    pass
+
+def _reference(number: int) -> None:
+    """Fixed amount of interpreter work to measure the speed of the machine against: number calls in a loop"""
+    for _ in range(number):
+        _noop()
+
+def measure_update(number: int = 100_000, repeat: int = 7, spinner_name: str = None, **kwargs) -> dict:
+    """Nanoseconds per bar() call for a bar built with kwargs (and spinner_name set), writing to a null sink"""
+    kwargs.setdefault('sink', 'null')
+    kwargs.setdefault('log', False)     # a null sink is no terminal, but the drawing path is what is measured
+    def prepare():
+        bar = ProgressBar(number, **kwargs)
+        if spinner_name is not None:
+            bar.set_spinner(spinner_name)
+        def operate():
+            for _ in range(number):
+                bar()
+        return operate
+    return measure(prepare, number, repeat)
+
+def measure_construction(cls, number: int = 1_000, repeat: int = 7, *args, **kwargs) -> dict:
+    """Nanoseconds per construction of cls(*args, **kwargs)"""
+    def prepare():
+        def operate():
+            for _ in range(number):
+                cls(*args, **kwargs)
+        return operate
+    return measure(prepare, number, repeat)
+
+def measure_import(module: str = 'progress', repeat: int = 7) -> dict:
+    """Nanoseconds to import module in a fresh interpreter, without a reference (it has no place in compare)"""
+    code = f'import time; start = time.perf_counter_ns(); import {module}; print(time.perf_counter_ns() - start)'
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout
+        timings.append(int(out))
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stdev': statistics.stdev(timings) if repeat > 1 else 0.,
+        'repeat': repeat,
+        'number': 1,
+    }
+
+def configurations() -> dict:
+    """All bar configurations that are benchmarked, by name, as measure_update keyword arguments"""
+    configs = {
+        'default': {},
+        'colored': dict(color='green', bg_color='yellow'),
+        'coalesced': dict(color='green', bg_color='yellow', coalesce=True),
+        'incremental': dict(incremental=True),
+        'rate': dict(rate=True),
+        'log': dict(log=True),
+        'preset_minimal': dict(preset='minimal'),
+        'preset_oldschool': dict(preset='oldschool'),
+    }
+    for name in Spinner().dictionary:
+        if name:
+            configs[f'spinner_{name}'] = dict(spinner_name=name)
+    for width in [10, 50, 100, 500]:
+        configs[f'width_{width}'] = dict(bar_width=width)
+    return configs
+
+def run(number: int, repeat: int) -> dict:
+    """Run the complete suite, results are in nanoseconds per operation"""
+    results = dict()
+    for name, kwargs in configurations().items():
+        results[f'update/{name}'] = measure_update(number, repeat, **kwargs)
+    constructions = max(number // 100, 10)
+    results['construct/ProgressBar'] = measure_construction(ProgressBar, constructions, repeat, 100, sink='null', log=False)
+    results['construct/ProgressBar_colored'] = measure_construction(ProgressBar, constructions, repeat, 100, sink='null', log=False, color='red', bg_color='white')
+    results['construct/ProgressBar_minimal'] = measure_construction(ProgressBar, constructions, repeat, 100, sink='null', log=False, preset='minimal')
+    results['construct/Style'] = measure_construction(Style, constructions, repeat)
+    results['construct/Spinner'] = measure_construction(Spinner, constructions, repeat, 'default')
+    results['import/progress'] = measure_import('progress', repeat)
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float, noise: float = 3.) -> list[str]:
+    """
+    Names of the benchmarks that got slower than in the baseline
+    ---
+    params:
+        - threshold: [float] allowed slowdown of the fastest run, as a fraction of the baseline
+        - noise: [float] the slowdown also has to exceed this many standard deviations of the runs (baseline
+                 and new runs pooled)
+    ---
+    the fastest run is compared relative to the reference loop (see measure), so it does not matter how fast
+    the machine is at the time, results without a reference (the import time) are only checked by over_budget
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline or 'relative' not in result or 'relative' not in baseline[name]:
+            continue
+        if change(result, baseline[name]) > max(threshold, noise * spread(result, baseline[name])):
+            regressions.append(name)
+    return regressions
+
+def change(result: dict, baseline: dict) -> float:
+    """Slowdown of a result relative to the reference loop as a fraction of its baseline, negative for a speedup"""
+    return result['relative'] / baseline['relative'] - 1
+
+def spread(result: dict, baseline: dict) -> float:
+    """Pooled standard deviation of the runs of a result and its baseline, as a fraction of the baseline"""
+    return (result['relative_stdev'] ** 2 + baseline['relative_stdev'] ** 2) ** .5 / baseline['relative']
+
+def over_budget(results: dict) -> list[str]:
+    """Names of the benchmarks whose median exceeds their budget"""
+    return [name for name, budget in BUDGETS.items() if name in results and results[name]['median'] > budget]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Microbenchmarks for the progress bar')
+    parser.add_argument('--number', type=int, default=20_000, help='operations per timed run')
+    parser.add_argument('--repeat', type=int, default=7, help='number of timed runs per benchmark')
+    parser.add_argument('--save', metavar='PATH', help='write the results to a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare the results against a JSON baseline')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--noise', type=float, default=3., help='a slowdown also has to exceed this many pooled standard deviations')
+    args = parser.parse_args()
+
+    results = run(args.number, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    for name, result in results.items():
+        line = f'{name:<40} {result["median"]:>10.1f} ns  (min {result["min"]:.1f}, stdev {result["stdev"]:.1f})'
+        if baseline is not None and 'relative' in result and 'relative' in baseline.get(name, {}):
+            line += f'  {100 * change(result, baseline[name]):+.1f}%'
+        print(line)
+
+    failed = 0
+    exceeded = over_budget(results)
+    if exceeded:
+        print(f'\n{len(exceeded)} benchmark(s) over budget: {", ".join(exceeded)}')
+        failed = 1
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.noise)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {100 * args.threshold:.0f}%: {", ".join(regressions)}')
+            return 1
+        print(f'\nno regressions beyond {100 * args.threshold:.0f}%')
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
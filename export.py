@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+out-of-band progress through memory-mapped status files
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+---
+usage:
+    python export.py job1.status job2.status    # draw the exported bars until all of them are closed
+    python export.py --stale 60 job1.status     # also give up on a bar that was not exported for a minute
+a bar exports with ProgressBar(n, export='job1.status'), add render='off' to draw nothing at all
+"""
+
+import argparse
+import mmap
+import os
+import socket
+import struct
+import sys
+from time import monotonic, sleep, time
+
+MAGIC = b'PBAR'
+VERSION = 2
+
+# fixed layout, little endian: a header, a sequence counter, the state that changes and the metadata that does not
+_HEADER = struct.Struct('<4sI')                 # magic, version
+_SEQUENCE = struct.Struct('<Q')                 # odd while the state is being written
+_STATE = struct.Struct('<qqqdd')                # i, n_iters (-1 when unknown), status, rate (NaN when unknown), updated
+_META = struct.Struct('<qd16s64s')              # pid, start, unit, host
+_SEQUENCE_AT = _HEADER.size
+_STATE_AT = _SEQUENCE_AT + _SEQUENCE.size
+_META_AT = _STATE_AT + _STATE.size
+SIZE = _META_AT + _META.size
+
+RUNNING, DONE, CLOSED = 0, 1, 2                 # CLOSED: closed before completion
+
+_HOST = socket.gethostname()
+
+class StatusFile:
+    def __init__(self, path: str, n_iters: int = None, unit: str = 'it', start: float = None) -> None:
+        """
+        Writer side of a status file, the file is created (or overwritten) and mapped into memory
+        ---
+        params:
+            - path: [str] file to export to, a path on /dev/shm keeps it in memory only
+            - n_iters: [int] total number of iterations, None when unknown
+            - unit: [str] name of what is counted, at most 16 bytes are stored
+            - start: [float] wall clock time (time.time) at which the progress started, now by default
+        ---
+        publishing only stores into the mapping, there is no system call, a reader in another process sees the
+        stores right away
+        """
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)                        # the mapping keeps the file alive
+        _HEADER.pack_into(self._map, 0, bytes(4), 0)       # an earlier run may have left a complete file behind
+        self._sequence = 0
+        self.n_iters = -1 if n_iters is None else n_iters
+        _META.pack_into(self._map, _META_AT, os.getpid(), time() if start is None else start, unit.encode()[:16],
+                        _HOST.encode()[:64])
+        self.publish(0, RUNNING, None)
+        _HEADER.pack_into(self._map, 0, MAGIC, VERSION)     # written last, readers ignore the file until then
+
+    def publish(self, i: int, status: int = RUNNING, rate: float = None) -> None:
+        """Store the current state, readers retry when they catch it halfway"""
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_AT, self._sequence)
+        _STATE.pack_into(self._map, _STATE_AT, i, self.n_iters, status, float('nan') if rate is None else rate, time())
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_AT, self._sequence)
+
+    def close(self) -> None:
+        """Unmap the file, it stays on disk with the last published state"""
+        self._map.close()
+
+
+class StatusReader:
+    def __init__(self, path: str) -> None:
+        """Reader side of a status file, maps it read-only so repeated reads are plain loads"""
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), SIZE, access=mmap.ACCESS_READ)
+        magic, version = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'"{path}" is not a version {VERSION} progress status file')
+
+    def read(self, retries: int = 1000) -> dict:
+        """
+        Consistent snapshot of the exported bar
+        ---
+        returns:
+            - i, n_iters: iterations done and total iterations (None when unknown)
+            - done, closed: whether the bar completed, and whether it was closed (before completion or not)
+            - rate: moving average of iterations per second as last exported (None until known)
+            - eta: estimated seconds until completion (None when unknown)
+            - start, updated: wall clock times of the start and the last export, elapsed: seconds since the start
+            - pid, host, unit: process id and host name of the exporter, and name of what is counted
+        """
+        for _ in range(retries):
+            before, = _SEQUENCE.unpack_from(self._map, _SEQUENCE_AT)
+            state = _STATE.unpack_from(self._map, _STATE_AT)
+            after, = _SEQUENCE.unpack_from(self._map, _SEQUENCE_AT)
+            if before == after and not before % 2:
+                break
+        else:
+            raise RuntimeError(f'No consistent state in "{self.path}" after {retries} attempts')
+        i, n_iters, status, rate, updated = state
+        pid, start, unit, host = _META.unpack_from(self._map, _META_AT)
+        n_iters = None if n_iters < 0 else n_iters
+        rate = None if rate != rate else rate   # NaN
+        done = status == DONE
+        eta = 0. if done else (n_iters - i) / rate if rate and n_iters is not None and status == RUNNING else None
+        return {
+            'i': i,
+            'n_iters': n_iters,
+            'done': done,
+            'closed': status != RUNNING,
+            'rate': rate,
+            'eta': eta,
+            'start': start,
+            'updated': updated,
+            'elapsed': (updated if status != RUNNING else time()) - start,
+            'pid': pid,
+            'host': host.rstrip(b'\0').decode(errors='replace'),
+            'unit': unit.rstrip(b'\0').decode(errors='replace'),
+        }
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def read_status(path: str) -> dict:
+    """Snapshot of the bar exported to path, see StatusReader.read"""
+    reader = StatusReader(path)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+def _alive(pid: int) -> bool:
+    """Whether a process with this id exists on this host, assumed so where that cannot be checked"""
+    if os.name != 'posix':
+        return True                             # os.kill would terminate the process on windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass                                    # exists, but belongs to another user
+    return True
+
+def _abandoned(status: dict, stale: float = None) -> bool:
+    """Whether the exporter of a running bar stopped without closing it (it crashed or was killed)"""
+    if status['closed']:
+        return False
+    if stale is not None and time() - status['updated'] > stale:
+        return True
+    return status['host'] == _HOST and not _alive(status['pid'])
+
+def watch(paths: list[str], interval: float = 0.1, sink = 'stdout', log: bool = None, stale: float = None) -> None:
+    """
+    Draw the bars exported to paths as one block until all of them are closed
+    ---
+    params:
+        - paths: [list[str]] status files, files that do not exist yet are picked up once they appear
+        - interval: [float] number of seconds between two reads of the files
+        - sink, log: where and how the block is drawn, see MultiProgress
+        - stale: [float] number of seconds without an export after which a running bar is given up on, None to
+                 wait for as long as its exporter is alive (exporting only happens when the bar would be redrawn,
+                 so slow iterations need a generous value)
+    ---
+    a file that started before the watch and is already closed, or whose exporter is gone, is left over from an
+    earlier run and is only picked up once a new run rewrites it. A bar whose exporter dies (checked on this host
+    by its pid) or goes stale is closed where it stands.
+    """
+    from multi import MultiProgress
+
+    started = time()
+    readers = dict.fromkeys(paths)              # path -> StatusReader, None until attached
+    bars = dict()                               # path -> mirroring bar
+    closed = set()
+    with MultiProgress(interval, sink, log) as multi:
+        while True:
+            for path in paths:
+                if readers[path] is None:
+                    try:
+                        reader = StatusReader(path)
+                    except (OSError, ValueError):
+                        break                   # not created (or not completely written) yet, keep the order of paths
+                    status = reader.read()
+                    if status['start'] < started and (status['closed'] or _abandoned(status, stale)):
+                        reader.close()
+                        break                   # left over from an earlier run, wait for the next one
+                    readers[path] = reader
+                if path in closed:
+                    continue
+                status = readers[path].read()
+                bar = bars.get(path)
+                if bar is None:
+                    bar = bars[path] = multi.add(status['n_iters'], rate=True, unit=status['unit'])
+                bar._start_time = monotonic() - status['elapsed']   # show the exporter's times, not the watcher's
+                bar._rate = status['rate']
+                bar._sampled = (float('inf'), 0)                   # and its rate, the mirror does not sample
+                bar.update(status['i'] - bar.i)
+                if status['closed'] or _abandoned(status, stale):
+                    bar.close()
+                    closed.add(path)
+            if len(closed) == len(paths):
+                break
+            sleep(interval)
+    for reader in readers.values():
+        if reader is not None:
+            reader.close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Draw progress bars exported to status files by other processes')
+    parser.add_argument('paths', nargs='+', metavar='PATH', help='status files, see ProgressBar(export=...)')
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between two reads of the files')
+    parser.add_argument('--stale', type=float, default=None,
+                        help='seconds without an export after which a running bar is given up on')
+    args = parser.parse_args()
+    for k, path in enumerate(args.paths):
+        print(f'{k}: {path}')
+    try:
+        watch(args.paths, args.interval, stale=args.stale)
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
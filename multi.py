@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+multiple stacked progress bars
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+"""
+
+import threading # bars may be drawn from render threads
+from functools import partial
+from time import monotonic
+
+from progress import ProgressBar, log_mode
+from sink import get_sink
+
+class _Line:
+    """One row of the block, with the text it should show and the text it currently shows"""
+    __slots__ = ('row', 'text', 'written')
+
+    def __init__(self, row: int) -> None:
+        self.row = row
+        self.text = ''
+        self.written = ''
+
+class MultiProgress:
+    def __init__(self, min_interval: float = 0.05, sink = 'stdout', log: bool = None) -> None:
+        """
+        Container that draws several progress bars as one block of lines
+        ---
+        params:
+            - min_interval: [float] minimum number of seconds between two frames (final frames are always drawn)
+            - sink: where frames are written to, see ProgressBar
+            - log: [bool] set to True to let every bar write its own log lines instead of drawing a block,
+                   decided like for ProgressBar by default
+        ---
+        the cursor rests on the line below the block, a frame moves up to every line that changed,
+        rewrites only that line and moves back down, all in a single write
+        """
+        self.min_interval = min_interval
+        self.sink = get_sink(sink)
+        self.log = log_mode(log, self.sink)
+        self.bars = []                  # bars in display order, top to bottom
+        self._lines = dict()            # bar -> _Line
+        self._dirty = set()             # lines whose text differs from what was written
+        self._pending = ''              # output that has to go out with the next frame
+        self._last_frame = float('-inf')
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'MultiProgress':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, n_iterations: int, **kwargs) -> ProgressBar:
+        """Create a bar on a new line below the block, takes the same parameters as ProgressBar (incremental is ignored)"""
+        if self.log:
+            bar = ProgressBar(n_iterations, **dict(kwargs, sink=self.sink, log=True))
+            self.bars.append(bar)
+            return bar
+        bar = ProgressBar(n_iterations, **dict(kwargs, log=False, incremental=False))    # lines are diffed here already
+        with self._lock:
+            self._lines[bar] = _Line(len(self.bars))
+            self.bars.append(bar)
+            self._pending += '\n'       # make room, the cursor rests below the new line
+        bar._write = partial(self._receive, bar)
+        return bar
+
+    def remove(self, bar: ProgressBar) -> None:
+        """Delete the line of a bar, lines below it shift up without being redrawn"""
+        if self.log:
+            self.bars.remove(bar)
+            return
+        with self._lock:
+            line = self._lines.pop(bar)
+            self._dirty.discard(line)
+            del self.bars[line.row]
+            up = len(self.bars) + 1 - line.row
+            self._pending += f'\033[{up}A\033[M'                # delete the line, the rest scrolls up
+            if up > 1:
+                self._pending += f'\033[{up-1}B'
+            self._pending += '\r'
+            for other in self.bars[line.row:]:
+                self._lines[other].row -= 1
+            self._flush()
+
+    def refresh(self) -> None:
+        """Write all changed lines now"""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        """Draw the final frame of every bar"""
+        for bar in self.bars:
+            bar.close()
+        self.refresh()
+        self.sink.flush()
+
+    def _receive(self, bar: ProgressBar, text: str) -> None:
+        """Take a frame from one of the bars instead of letting it write to the terminal"""
+        text = text.strip('\r\n')
+        if not text:                    # line releases are handled by the block itself
+            return
+        with self._lock:
+            line = self._lines.get(bar)
+            if line is None:            # removed in the meantime
+                return
+            line.text = text
+            if text != line.written:
+                self._dirty.add(line)
+            if bar.done or monotonic() - self._last_frame >= self.min_interval:
+                self._flush()
+
+    def _flush(self) -> None:
+        """Compose one frame out of the pending output and the changed lines, and write it (lock held)"""
+        frame = [self._pending]
+        rest = len(self.bars)           # row the cursor rests on
+        current = rest
+        for line in sorted(self._dirty, key=lambda line: line.row, reverse=True):    # bottom up, only moving up
+            frame.append(f'\033[{current - line.row}A')
+            frame.append(f'\r{line.text}\033[K')                # rewrite the line and clear what is left of it
+            line.written = line.text
+            current = line.row
+        if current < rest:
+            frame.append(f'\033[{rest - current}B\r')
+        self._dirty.clear()
+        self._pending = ''
+        frame = ''.join(frame)
+        if frame:
+            self._write(frame)
+        self._last_frame = monotonic()
+
+    def _write(self, text: str) -> None:
+        """Write text to the sink"""
+        self.sink.write(text)
+
+
+if __name__ == '__main__':
+    print('Do not run this file directly.')
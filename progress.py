@@ -6,17 +6,70 @@ Initial commit: 01-04-2022
 Author: J.D. Hamelink
 """
 
+import atexit
+import os
+import threading # background rendering
+import weakref
+from itertools import islice
+from math import exp
+from time import monotonic, perf_counter
+from types import MappingProxyType
+
 from style import Style
 from spinner import Spinner
+from sink import get_sink
+
+# predefined style configurations, applied as a sequence of setter calls
+PRESETS = MappingProxyType({
+    'minimal': dict(percentage = False, steps = (
+        ('set_braces',  ('[]',),            (('color', 'blue'), ('bg_color', 'white'))),
+        ('set_char',    ('━',),             (('color', 'blue'), ('bg_color', 'white'))),
+        ('style',       ('bold', 'base'),   ()),
+        ('set_head',    ('►',),             (('color', 'blue'), ('bg_color', 'white'))),
+        ('set_todo',    ('━',),             (('color', 'blue'), ('bg_color', 'white'))),
+        ('style',       ('faint', 'todo'),  ()),
+        ('set_spinner', ('slider',),        ()),
+    )),
+    'oldschool': dict(percentage = False, steps = (
+        ('set_braces',  ('  ',),            (('color', 'green'), ('bg_color', 'black'))),
+        ('set_char',    ('■',),             (('color', 'green'), ('bg_color', 'black'))),
+        ('set_head',    ('■',),             (('color', 'green'), ('bg_color', 'black'))),
+        ('set_todo',    ('□',),             (('color', 'green'), ('bg_color', 'black'))),
+        ('style',       ('faint', 'todo'),  ()),
+        ('set_spinner', ('dynamic_quarter',), ()),
+    )),
+})
+
+# attributes that make up the look of a bar, resolved from the constructor arguments on first use
+_LOOK = ('base_char', 'head_char', 'todo_char', 'open_brace_char', 'close_brace_char', 'spinner', 'show_percentage',
+         'spin_interval')
+_LOOKS = dict()         # constructor arguments -> resolved look, shared by all bars
+_MAX_LOOKS = 256
+
+_RENDERING = weakref.WeakSet()      # bars with a render thread that were not closed yet
+
+@atexit.register
+def _close_rendering() -> None:
+    """Close the bars that are left with a render thread, whose daemon thread would die before the final frame"""
+    for bar in list(_RENDERING):
+        bar.close()
 
 class ProgressBar:
+    smoothing = 2.                      # time constant of the moving average of the rate, in seconds
+    min_sample = 0.05                   # shortest time span a rate sample may cover, in seconds
+
     def __init__(self, n_iterations: int, bar_width: int = 50, char: str = '=', head: str = '>', todo: str = '-', braces: str = '[]',
-                 spinner: bool = True, percentage: bool = True, color: str = None, bg_color: str = None, preset: str = None) -> None:
+                 spinner: bool = True, percentage: bool = True, color: str = None, bg_color: str = None, preset: str = None,
+                 min_interval: float = 0, coalesce: bool = False, render: str = 'inline', refresh: float = 0.1,
+                 threads: bool = False, sink = 'stdout', incremental: bool = False, rate: bool = False,
+                 log: bool = None, log_every: float = 10, log_interval: float = None, spin_interval: float = None,
+                 unit: str = 'it', export: str = None) -> None:
         """
         Progress bar for visualizing a process with fixed number of iterations
         ---
         params:
-            - n_iterations: [int] total number of iterations to be processed
+            - n_iterations: [int] total number of iterations to be processed, None when unknown (a spinner and
+                            the count are shown instead of the bar until the bar is closed)
             - bar_width: [int] width of progress bar in characters
             - char: [str] *single* character representing the loaded portion of the bar
             - head: [str] *single* character leading the loaded portion of the bar
@@ -27,32 +80,303 @@ class ProgressBar:
             - color: [str] color to set all three bar characters as
             - bg_color: [str] color to set the backgrounds for all three bar characters as
             - preset: [str] choose from a select few presets {minimal, oldschool}
+            - min_interval: [float] minimum number of seconds between two redraws (the final frame is always drawn)
+            - coalesce: [bool] set to True to emit one style prefix per run of identically styled characters
+            - render: [str] where frames are drawn {inline, thread, off}, with thread an update only increments a counter
+                      and a daemon thread redraws the bar every refresh seconds (a bar that is never closed is closed
+                      at interpreter exit), with off nothing is drawn or logged (for bars that are only exported)
+            - refresh: [float] number of seconds between two redraws of the render thread
+            - threads: [bool] set to True when several threads update the same bar, every thread counts in its
+                       own shard and the render thread (implied) sums the shards, so updates never take a lock
+            - sink: where frames are written to {stdout, stderr, null}, a file descriptor, a file object or a Sink
+            - incremental: [bool] set to True to only write the cells and suffix characters that changed since the
+                           previous frame, the line is redrawn in full after write() or a terminal resize
+            - rate: [bool] set to True for the number of iterations per second and the ETA in the suffix
+            - log: [bool] set to True for plain lines at milestones instead of a redrawn bar, by default this is
+                   decided by the PROGRESS_LOG environment variable (1/0) or else by whether the sink is a terminal
+            - log_every: [float] percentage between two log lines, None for time based lines only
+            - log_interval: [float] number of seconds after which a log line is written regardless of log_every,
+                            the clock is checked on updates (a line waits for the next update, or the next
+                            redraw with render thread)
+            - spin_interval: [float] number of seconds per spinner frame, the spinner then follows the clock
+                             instead of the progress (it still only moves when the bar is redrawn)
+            - unit: [str] name of what is counted, used in rates and counts
+            - export: [str] path of a status file the progress is published to whenever the bar would be redrawn,
+                      for watching it from another process (see export.py)
         """
+        if render not in ['inline', 'thread', 'off']:
+            raise ValueError(f'Invalid render mode "{render}", only inline, thread and off are supported')
+        if threads:
+            render = 'thread'       # only the render thread may write to the terminal
         self.n_iters = n_iterations
         self.bar_width = bar_width
+        self.min_interval = min_interval
+        self.coalesce = coalesce
+        self.render = render
+        self.refresh = refresh
+        self.sink = get_sink(sink)
+        self.incremental = incremental
+        self.log = log_mode(log, self.sink)
+        self.log_every = log_every
+        self.log_interval = log_interval
+        self.unit = unit
         
         self.show_spinner = spinner
-        self.show_percentage = percentage
+        self.show_rate = rate
 
         self.S = Style()
+        self._frames = None
 
-        self.set_char(char, color, bg_color)
-        self.set_head(head, color, bg_color)
-        self.set_todo(todo, color, bg_color)
-        self.set_braces(braces, color, bg_color)
-
-        spinner_name = 'default' if spinner else ''
-        self.set_spinner(spinner_name, color, bg_color)
-        self.set_preset(preset)
+        self._pending = (char, head, todo, braces, spinner, percentage, color, bg_color, preset, spin_interval)
+        if self._pending not in _LOOKS:     # the first bar with this look validates and resolves it right away
+            self._resolve()
 
         self.i = 0
         self.done = False
+        self._next_change = 1           # iteration at which the visible state can change next
+        self._last_state = None         # (steps, percentage, spinner phase) of the last drawn frame
+        self._last_render = float('-inf')
+        self._finished = False          # True once the final frame has been drawn
+        self._drawn = None              # (steps, suffix) currently on screen, for incremental frames
+        self._size = None               # terminal size at the last full redraw
+        self._milestone = 0             # log_every milestones reached at the last log line
+
+        self._start_time = monotonic()  # instrumentation, all O(1)
+        self._sampled = (self._start_time, 0)    # (time, i) of the last rate sample
+        self._rate = None               # moving average of iterations per second
+        self._renders = 0
+        self._compose_time = 0.
+        self._render_time = 0.
+
+        self._children = []             # child bars that are still running, see child()
+        self._partial = 0.              # iterations contributed by the running children
+        self._tail = ''                 # end of the suffix, clears the line once children can shorten it
+
+        self._export = None             # status file, only used when export is set
+        if export is not None:
+            from export import StatusFile   # mmap and struct, only when used
+            self._export = StatusFile(export, n_iterations, unit)
+
+        self._shards = None             # per thread counters, only used when threads is set
+        if threads:
+            self._shards = []
+            self._local = threading.local()
+            self._lock = threading.Lock()
+        if render == 'thread':
+            self._update = self._count_shard if threads else self._count    # hot path only counts, the thread draws
+            self._stop = threading.Event()
+            self._renderer = threading.Thread(target=self._render_loop, daemon=True)
+            self._renderer.start()
+            _RENDERING.add(self)
         pass
 
+    def __getattr__(self, name: str):
+        """Resolve the look of the bar when one of its attributes is first used"""
+        if name in _LOOK and self.__dict__.get('_pending') is not None:
+            self._resolve()
+            return getattr(self, name)
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
     def __call__(self) -> None:
         """Wrapper for update function"""
         return self._update()
 
+    def __iter__(self):
+        """Iterate over range(n_iterations) while advancing the bar"""
+        if self.n_iters is None:
+            raise TypeError('Cannot iterate over a bar without a total, use wrap() to advance it over an iterable')
+        return self.wrap(range(self.n_iters))
+
+    def update(self, n: int = 1) -> None:
+        """Update the progress bar by n iterations at once, with a single redraw check"""
+        self._update(n)
+
+    def wrap(self, iterable):
+        """
+        Yield the items of iterable, advancing the bar by one after every item
+        ---
+        the bar is closed when the iterable is exhausted or the loop is left early
+        """
+        try:
+            if self.render == 'thread':
+                update = self._update
+                for item in iterable:
+                    yield item
+                    update()
+            else:
+                for item in iterable:       # same as _update, inlined to save a call per item
+                    yield item
+                    self.i += 1
+                    if self.i >= self._next_change:
+                        self._refresh()
+        finally:
+            self.close()
+
+    def __enter__(self) -> 'ProgressBar':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the render thread (if any) and make sure the final frame is drawn"""
+        for child in self._children:
+            child._detach()                     # their progress so far stays in the final frame
+        self._children = []
+        if self.render == 'thread':
+            self._stop.set()
+            self._renderer.join()
+            _RENDERING.discard(self)
+        self._collect()
+        if self.n_iters is None:
+            self.done = True                    # a bar without a total is complete when it is closed
+        else:
+            self.i = min(self.i, self.n_iters)  # counted in a thread or process, may have overshot
+        if not self._finished:
+            self._refresh(force=True)
+            if not (self.done or self.log or self.render == 'off'):    # interrupted before completion, release the line
+                self._write('\n')
+        self._finalize()
+
+    def _finalize(self) -> None:
+        """Write out what the sink holds back and publish the final state, after the final frame"""
+        self.sink.flush()
+        if self._export is not None:
+            from export import DONE, CLOSED
+            self._export.publish(self.i, DONE if self.done else CLOSED, self._rate)
+            self._export.close()
+            self._export = None
+
+    @classmethod
+    def map(cls, fn, iterable, executor: str = 'thread', workers: int = None, chunksize: int = 1, ordered: bool = True,
+            in_flight: int = None, **kwargs):
+        """
+        Apply fn to every item of iterable on a pool, yielding the results while a bar tracks completion
+        ---
+        params:
+            - fn: [callable] function of one item, has to be picklable for the process executor
+            - iterable: [iterable] items to process, the bar has no total when it has no length
+            - executor: [str] kind of pool to run on {thread, process}
+            - workers: [int] number of pool workers, the executor default when None
+            - chunksize: [int] number of items sent to a worker at once, larger chunks amortize overhead for tiny tasks
+            - ordered: [bool] set to False to yield results as soon as their chunk completes
+            - in_flight: [int] maximum number of chunks that are submitted or waiting for their turn, two per
+                         worker by default, so a long iterable is consumed as results are used
+            - kwargs: any other ProgressBar parameter
+        ---
+        chunks that did not start yet are cancelled when the loop is left early or fn raises
+        """
+        from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED    # heavy, only when used
+
+        if executor not in ['thread', 'process']:
+            raise ValueError(f'Invalid executor "{executor}", only thread and process are supported')
+        try:
+            n_iterations = len(iterable)
+        except TypeError:
+            n_iterations = None
+        if n_iterations == 0:
+            return
+
+        items = iter(iterable)
+        chunks = enumerate(iter(lambda: list(islice(items, chunksize)), []))   # consecutive chunks until exhausted
+        pool_cls = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+        pool = pool_cls(workers)
+        if in_flight is None:
+            in_flight = 2 * pool._max_workers
+        try:
+            with cls(n_iterations, **kwargs) as bar:
+                futures = dict()                                        # running or queued chunks -> index
+                pending = dict()                                        # finished chunks waiting for their turn
+                next_index = 0
+                exhausted = False
+                while True:
+                    while not exhausted and len(futures) + len(pending) < in_flight:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            exhausted = True
+                        else:
+                            futures[pool.submit(_run_chunk, fn, chunk[1])] = chunk[0]
+                    if not futures:
+                        break
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = futures.pop(future)
+                        results = future.result()
+                        bar._update(len(results))
+                        if not ordered:
+                            yield from results
+                            continue
+                        pending[index] = results
+                    while next_index in pending:
+                        yield from pending.pop(next_index)
+                        next_index += 1
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def child(self, n_iterations: int, weight: float = 1) -> 'ChildBar':
+        """
+        Create a sub-task that advances this bar by weight iterations over its own n_iterations
+        ---
+        params:
+            - n_iterations: [int] number of iterations of the sub-task, None when unknown (it then only counts
+                            once it is closed)
+            - weight: [float] number of iterations of this bar the complete sub-task is worth
+        ---
+        the work of a child is counted by the child only, this bar is not updated for it as well.
+        The child draws nothing, every update adds its share to this bar right away and the bar redraws (with the
+        counts of the running children in the suffix) when its own thresholds are crossed. A finished or closed
+        child is folded into the iteration count and no longer referenced, so any number of short-lived
+        children can be created. Children are meant to be updated from the thread that renders the bar, or from
+        one thread when render is thread
+        """
+        child = ChildBar(self, n_iterations, weight)
+        self._tail = '\033[K'
+        if self.n_iters is not None and self.render != 'thread':
+            self._next_change = self._next_threshold(float(self._progress()))     # fractions of an iteration count now
+        return child
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the progress and of what the bar itself costs
+        ---
+        returns:
+            - i, n_iters, elapsed: iterations done, total iterations and seconds since construction
+            - rate: moving average of iterations per second (sampled on every redraw check), average_rate: i / elapsed
+            - eta: estimated seconds until completion (None until the rate is known)
+            - renders: number of frames drawn
+            - compose_time, render_time: total seconds spent composing and writing frames, and their averages
+            - overhead: fraction of the elapsed time spent composing and writing frames
+        """
+        elapsed = monotonic() - self._start_time
+        renders = max(self._renders, 1)
+        return {
+            'i': self.i,
+            'n_iters': self.n_iters,
+            'elapsed': elapsed,
+            'rate': self._rate,
+            'average_rate': self.i / elapsed if elapsed else None,
+            'eta': self._eta(),
+            'renders': self._renders,
+            'compose_time': self._compose_time,
+            'render_time': self._render_time,
+            'average_compose_time': self._compose_time / renders,
+            'average_render_time': self._render_time / renders,
+            'overhead': (self._compose_time + self._render_time) / elapsed if elapsed else 0.,
+        }
+
+    def write(self, text: str) -> None:
+        """Print a line of text above the bar, after which the bar is redrawn in full"""
+        if self.log or self.render == 'off':
+            return self._write(f'{text}\n')
+        self._write(f'\r\033[K{text}\n')
+        self.invalidate()
+        if self._last_state is not None and not self._finished:
+            self._refresh(force=True)
+
+    def invalidate(self) -> None:
+        """Make the next frame a full redraw, e.g. after something else wrote to the terminal"""
+        self._drawn = None
+
     def set_preset(self, preset: str) -> None:
         """
         Choose a predefined style configuration
@@ -61,28 +385,18 @@ class ProgressBar:
             - minimal
             - oldschool
         """
-        if preset == 'minimal':
-            self.spinner_frames = ['', '', '', '']
-            self.show_percentage = False
-            self.set_braces('[]', color = 'blue', bg_color = 'white')
-            self.set_char('━', color = 'blue', bg_color = 'white')
-            self.style('bold', 'base')
-            self.set_head('►', color = 'blue', bg_color = 'white')
-            self.set_todo('━', color = 'blue', bg_color = 'white')
-            self.style('faint', 'todo')
-            self.set_spinner('slider')
-        elif preset == 'oldschool':
-            self.spinner_frames = ['', '', '', '']
-            self.show_percentage = False
-            self.set_braces('  ', color = 'green', bg_color = 'black')
-            self.set_char('■', color = 'green', bg_color = 'black')
-            self.set_head('■', color = 'green', bg_color = 'black')
-            self.set_todo('□', color = 'green', bg_color = 'black')
-            self.style('faint', 'todo')
-            self.set_spinner('dynamic_quarter')
+        if self._pending is not None:
+            self._resolve()
+        if preset not in PRESETS:
+            return
+        self.show_percentage = PRESETS[preset]['percentage']
+        for method, args, kwargs in PRESETS[preset]['steps']:
+            getattr(self, method)(*args, **dict(kwargs))
 
     def set_char(self, char: str = None, color: str = None, bg_color: str = None) -> None:
         """Set *single* character to represent the loaded portion of the progress bar"""
+        if self._pending is not None:
+            self._resolve()
         if char is None:
             char = self.base_char                       # take the character that is already set
         elif not self._check_char(char):
@@ -92,9 +406,12 @@ class ProgressBar:
         if bg_color is not None:
             char = self.S.set_bg_color(bg_color, char)  # add background color to character
         self.base_char = char                           # store as attribute
+        self._frames = None                             # bar look changed, rebuild frame table lazily
 
     def set_head(self, char: str = None, color: str = None, bg_color: str = None) -> None:
         """Set *single* character to represent the head of the loaded portion of the progress bar"""
+        if self._pending is not None:
+            self._resolve()
         if char is None:
             char = self.head_char                       # take the character that is already set
         elif not self._check_char(char):
@@ -104,9 +421,12 @@ class ProgressBar:
         if bg_color is not None:
             char = self.S.set_bg_color(bg_color, char)  # add background color to character
         self.head_char = char                           # store as attribute
+        self._frames = None                             # bar look changed, rebuild frame table lazily
     
     def set_todo(self, char: str = None, color: str = None, bg_color: str = None) -> None:
         """Set *single* character to represent the portion of the progress bar that has yet to be loaded"""
+        if self._pending is not None:
+            self._resolve()
         if char is None:
             char = self.todo_char                       # take the character that is already set
         elif not self._check_char(char):
@@ -116,9 +436,12 @@ class ProgressBar:
         if bg_color is not None:
             char = self.S.set_bg_color(bg_color, char)  # add background color to character
         self.todo_char = char                           # store as attribute
+        self._frames = None                             # bar look changed, rebuild frame table lazily
     
     def set_braces(self, chars: str = None, color: str = None, bg_color: str = None) -> None:
         """Set *two* characters as braces for the bar"""
+        if self._pending is not None:
+            self._resolve()
         if chars is None:
             open_brace = self.open_brace_char                           # take the characters that are already set
             close_brace = self.close_brace_char                         # ""
@@ -135,10 +458,15 @@ class ProgressBar:
             close_brace = self.S.set_bg_color(bg_color, close_brace)    # ""
         self.open_brace_char = open_brace                               # store as attributes
         self.close_brace_char = close_brace                             # ""
+        self._frames = None                                             # bar look changed, rebuild frame table lazily
 
-    def set_spinner(self, name: str = 'default', color: str = None, bg_color: str = None) -> None:
-        """Set spinner, colors will be implemented shortly"""
-        self.spinner = Spinner(name)                         # initialize spinner
+    def set_spinner(self, name: str = 'default', color: str = None, bg_color: str = None, interval: float = None) -> None:
+        """Set spinner by its registered name (see spinner.register and spinner.load), with optional colors"""
+        if self._pending is not None:
+            self._resolve()
+        if interval is None:
+            interval = self.spin_interval                               # keep the animation mode of the bar
+        self.spinner = Spinner(name, color, bg_color, interval)         # initialize spinner
 
     def style(self, effect: str, part: str = None) -> None:
         """
@@ -152,25 +480,263 @@ class ProgressBar:
         ---
         TODO add support for multiple effects and multiple parts
         """
+        if self._pending is not None:
+            self._resolve()
         if effect not in ['bold', 'faint', 'italic', 'underline', 'blink']:
             raise ValueError(f'Invalid effect "{effect}", only bold, faint, italic, underline and blink are supported')
         apply_effect: function = getattr(Style, effect)                 # retrieve effect method from Style based on given string
         if part not in ['base', 'head', 'todo']:                        # TODO add support for braces, and suffix parts
             raise ValueError(f'Invalid part "{part}", only base, head and todo are supported')
         char_before = getattr(self, part+'_char')                       # retrieve bar attribute to be styled
-        setattr(self, part+'_char', apply_effect(Style(), char_before)) # store the new value in this attribute
+        setattr(self, part+'_char', apply_effect(self.S, char_before))  # store the new value in this attribute
+        self._frames = None                                             # bar look changed, rebuild frame table lazily
+
+    def _resolve(self) -> None:
+        """Apply the look given to the constructor, taking it from the shared cache when it was resolved before"""
+        key, self._pending = self._pending, None
+        look = _LOOKS.get(key)
+        if look is not None:
+            self.__dict__.update(look)
+            return
+        char, head, todo, braces, spinner, percentage, color, bg_color, preset, self.spin_interval = key
+        self.show_percentage = percentage
+        self.set_char(char, color, bg_color)
+        self.set_head(head, color, bg_color)
+        self.set_todo(todo, color, bg_color)
+        self.set_braces(braces, color, bg_color)
+        spinner_name = 'default' if spinner else ''
+        self.set_spinner(spinner_name, color, bg_color)
+        self.set_preset(preset)
+        if len(_LOOKS) < _MAX_LOOKS:
+            _LOOKS[key] = {attr: self.__dict__[attr] for attr in _LOOK}
 
-    def _update(self) -> None:
-        """Update the progress bar by one iteration"""
-        self.i += 1
-        if self.i == self.n_iters:
+    def _update(self, n: int = 1) -> None:
+        """Update the progress bar by n iterations"""
+        self.i += n
+        if self.i >= self._next_change:     # nothing visible can have changed before this threshold
+            self._refresh()
+
+    def _count(self, n: int = 1) -> None:
+        """Update the progress bar by n iterations without drawing it (render thread mode)"""
+        self.i += n
+
+    def _count_shard(self, n: int = 1) -> None:
+        """Update the progress bar by n iterations in the shard of the calling thread"""
+        try:
+            self._local.shard[0] += n   # only this thread ever writes to its shard
+        except AttributeError:
+            self._add_shard()[0] += n
+
+    def _add_shard(self) -> list[int]:
+        """Register a counter for the calling thread"""
+        shard = self._local.shard = [0]
+        with self._lock:                # taken once per thread, not once per update
+            self._shards.append(shard)
+        return shard
+
+    def _collect(self) -> None:
+        """Sum the per thread counters into the iteration count"""
+        if self._shards is not None:
+            self.i = sum(shard[0] for shard in self._shards)
+
+    def _render_loop(self) -> None:
+        """Redraw the bar every refresh seconds until it is complete or closed"""
+        while not self._stop.wait(self.refresh):
+            self._collect()
+            self._refresh()
+            if self._finished:
+                break
+
+    def _refresh(self, force: bool = False) -> None:
+        """Redraw the bar if its visible state has changed since the last frame"""
+        if self.n_iters is None:
+            return self._refresh_unsized(force)
+        if self.i >= self.n_iters:
+            self.i = self.n_iters           # overshooting updates do not move past the end
             self.done = True
-        
-        steps = int(self.bar_width * (self.i) // self.n_iters)      # number of blocks that the bar should be filled with
-        percentage = round(100 * (self.i) / float(self.n_iters))    # calculate percentage for suffix
-        
-        line = self._compose(steps, percentage)
-        self._render(line)
+            if self._finished and not force:
+                return
+
+        progress = self._progress()
+        if self.n_iters:
+            steps = int(self.bar_width * (progress) // self.n_iters)    # number of blocks that the bar should be filled with
+            percentage = round(100 * (progress) / float(self.n_iters))  # calculate percentage for suffix
+        else:                                                           # nothing to do is complete right away
+            steps, percentage = self.bar_width, 100
+        self._next_change = self._next_threshold(float(progress) if self._children else progress)
+        now = monotonic()
+        self._sample(now)
+        if self._export is not None:
+            self._export.publish(self.i, self.done, self._rate)    # running (0) or done (1)
+        if self.render == 'off':
+            self._finished = self.done
+            return
+        if self.log:
+            if self.log_interval is not None:   # also check the clock between thresholds, about 10 times per interval
+                step = max(1, int((self._rate or 0) * self.log_interval / 10))
+                self._next_change = min(self._next_change, progress + step)
+            return self._log(now, force)
+
+        state = (steps, percentage, self.spinner.phase())           # phase is None unless the spinner follows the clock
+        if not (force or self.done):
+            if state == self._last_state:
+                return
+            if self.min_interval and now - self._last_render < self.min_interval:
+                return
+        self._last_state = state
+        self._last_render = now
+
+        start = perf_counter()
+        if self.incremental:
+            self._draw_incremental(steps, percentage)
+        else:
+            line = self._compose(steps, percentage)
+            composed = perf_counter()
+            self._compose_time += composed - start
+            start = composed
+            self._render(line)
+        self._render_time += perf_counter() - start
+        self._renders += 1
+
+    def _refresh_unsized(self, force: bool = False) -> None:
+        """Show a spinner, the count and the rate for a bar without a total, at most every min_interval/refresh seconds"""
+        now = monotonic()
+        self._sample(now)
+        if self._export is not None:
+            self._export.publish(self.i, self.done, self._rate)
+        if self.render == 'off':
+            self._finished = self.done
+            return
+        if self._finished and not force:
+            return
+        interval = (self.log_interval or 10.) if self.log else (self.min_interval or self.refresh)
+        if not (force or now - self._last_render >= interval):
+            return
+        self._last_render = now
+        count = _format_count(self.i, self.unit)
+        elapsed = _format_time(now - self._start_time)
+        self._finished = self.done
+        if self.done:
+            line = f'{count} complete in {elapsed}'
+        else:
+            line = f'{count} {_format_rate(self._rate, self.unit)} elapsed {elapsed}'
+        if self.log:
+            line = f'{line}\n'
+        elif self.done:
+            line = f'\r{line}\033[K\n'                              # clear what is left of the longer progress line
+        else:
+            line = f'\r{self.spinner(self._renders)} {line}\033[K'
+        self._write(line)
+        self._renders += 1
+        if self._finished:
+            self.sink.flush()
+
+    def _log(self, now: float, force: bool = False) -> None:
+        """Write a plain line when a milestone is reached or log_interval has passed, nothing is composed"""
+        percentage = round(100 * self._progress() / float(self.n_iters)) if self.n_iters else 100
+        milestone = int(percentage // self.log_every) if self.log_every else self._milestone
+        due = milestone > self._milestone and percentage < 100     # completion gets its own line
+        if self.log_interval is not None and now - max(self._last_render, self._start_time) >= self.log_interval:
+            due = True
+        if not (force or self.done or due):
+            return
+        self._milestone = milestone
+        self._last_render = now
+        elapsed = _format_time(now - self._start_time)
+        if self.done:
+            self._finished = True
+            average = self.i / (now - self._start_time) if now > self._start_time else None
+            line = f'100% {self.i}/{self.n_iters} complete in {elapsed} ({_format_rate(average, self.unit)})\n'
+        else:
+            line = f'{percentage:>3}% {self.i}/{self.n_iters} {_format_rate(self._rate, self.unit)} elapsed {elapsed} ETA {_format_time(self._eta())}\n'
+        self._write(line)
+        self._renders += 1
+        if self._finished:
+            self.sink.flush()
+
+    def _sample(self, now: float) -> None:
+        """Fold the iterations since the previous sample into the moving average of the rate"""
+        then, i = self._sampled
+        span = now - then
+        if span < self.min_sample:          # too short to say anything, the next sample covers this span too
+            return
+        progress = self._progress()
+        rate = (progress - i) / span
+        weight = 1 - exp(-span / self.smoothing)    # a sample counts for as long as it lasted
+        self._rate = rate if self._rate is None else weight * rate + (1 - weight) * self._rate
+        self._sampled = (now, progress)
+
+    def _eta(self) -> float:
+        """Estimated number of seconds until completion"""
+        if self.done:
+            return 0.
+        if not self._rate or self.n_iters is None:
+            return None
+        return (self.n_iters - self._progress()) / self._rate
+
+    def _progress(self) -> float:
+        """Iterations done, including the share of the running children"""
+        if self._partial and self.n_iters is not None:
+            return min(self.i + self._partial, self.n_iters)
+        return self.i
+
+    def _add_partial(self, x: float) -> None:
+        """Add progress of a running child, in iterations of this bar"""
+        self._partial += x
+        if self.render != 'thread' and self.i + self._partial >= self._next_change:
+            self._refresh()
+
+    def _finish_child(self, child: 'ChildBar') -> None:
+        """Replace the share a child reported so far by its full weight"""
+        self._children.remove(child)
+        self._partial = self._partial - child._reported if self._children else 0.     # no rounding drift left
+        self._update(child.weight)
+
+    def _draw_incremental(self, steps: int, percentage: int) -> None:
+        """Write only what changed since the previous frame, or the full line when that is unknown"""
+        suffix = self._suffix(steps, percentage)
+        steps = min(steps, self.bar_width)
+        size = self.sink.terminal_size()                    # None when the sink is no terminal
+        if self.done or self._drawn is None or size != self._size:
+            self._drawn, self._size = (steps, suffix), size
+            return self._render(self._frame(steps) + suffix)
+
+        old_steps, old_suffix = self._drawn
+        out = []
+        if steps != old_steps:                              # new loaded cells from the old head onwards, plus the head
+            runs = [(self.base_char, steps - old_steps), (self.head_char, 1)]
+            cells = self.S.join_runs(runs) if self.coalesce else ''.join(count * char for char, count in runs)
+            out.append(f'\r\033[{1 + old_steps}C{cells}')
+        if suffix != old_suffix:                            # suffix characters from the first difference onwards
+            same = 0
+            if '\033' not in suffix + old_suffix:           # with a styled spinner, characters are not columns
+                while same < min(len(suffix), len(old_suffix)) and suffix[same] == old_suffix[same]:
+                    same += 1
+            out.append(f'\r\033[{self.bar_width + 3 + same}C{suffix[same:]}')
+            if len(suffix) < len(old_suffix):
+                out.append('\033[K')                       # clear what is left of a longer suffix
+        self._drawn = (steps, suffix)
+        if out:
+            self._write(''.join(out))
+
+    def _next_threshold(self, i: int) -> int:
+        """Find the first iteration after i at which the number of steps or the percentage changes"""
+        n, w = self.n_iters, self.bar_width
+        if n is None:
+            return i + 1                                            # no total, every update checks the clock
+        if i >= n:
+            return n                                                # only to clamp updates after completion
+        if isinstance(i, float):                                    # includes the share of children, thresholds are
+            steps = int(w * i // n)                                 # exact fractions instead of whole iterations
+            percentage = round(100 * i / float(n))
+            return min((steps + 1) * n / w, (percentage + .5) * n / 100, n)
+        steps = w * i // n
+        next_step = -(-(steps + 1) * n // w)                        # ceil division: first i with one more block
+        percentage = round(100 * i / float(n))
+        j = max(i + 1, int((percentage + .5) * n / 100))            # lower bound for the next percentage change
+        while j < next_step and round(100 * j / float(n)) == percentage:
+            j += 1
+        return min(next_step, j, n)
 
     def _check_char(self, char: str) -> bool:
         """Check if a given character is usable in the progress bar"""
@@ -182,18 +748,204 @@ class ProgressBar:
 
     def _compose(self, steps: int, percentage: int) -> str:
         """Compose the complete line that is to be printed"""
+        return self._frame(min(steps, self.bar_width)) + self._suffix(steps, percentage)
+
+    def _suffix(self, steps: int, percentage: int) -> str:
+        """Compose the spinner and percentage that follow the bar"""
         spin_char = self.spinner(min(steps, percentage))
-        bar = ( (steps * self.base_char) +                  # loaded portion
-                self.head_char +                            # head
-                (self.bar_width-steps) * self.todo_char)    # todo portion
         suffix = f'{spin_char} {percentage}%' if self.show_percentage else spin_char
-        return self.open_brace_char + bar + self.close_brace_char + suffix
-    
+        if self.show_rate:
+            suffix += f' {_format_rate(self._rate, self.unit)} ETA {_format_time(self._eta())}'
+        if self._children:
+            suffix += _describe(self._children)
+        return suffix + self._tail
+
+    def _frame(self, steps: int) -> str:
+        """Look up the braced bar body for a number of steps, building it on first use"""
+        frames = self._frames
+        if frames is None:                                  # invalidated by one of the setters
+            frames = self._frames = [None] * (self.bar_width + 2)
+        frame = frames[steps]
+        if frame is None:
+            if steps > self.bar_width:                      # last slot holds the completed bar
+                runs = [(self.base_char, self.bar_width+1)]
+            else:
+                runs = [(self.base_char, steps),                    # loaded portion
+                        (self.head_char, 1),                        # head
+                        (self.todo_char, self.bar_width-steps)]     # todo portion
+            runs = [(self.open_brace_char, 1)] + runs + [(self.close_brace_char, 1)]
+            if self.coalesce:
+                frame = self.S.join_runs(runs)
+            else:
+                frame = ''.join(count * char for char, count in runs)
+            frames[steps] = frame
+        return frame
+
     def _render(self, line: str) -> None:
         """Print the line on by replacing the previous line"""
         if self.done:   # if process is finished, suffix is changed and line gets a newline character
-            line = f'{self.open_brace_char}{(self.bar_width+1)*self.base_char}{self.close_brace_char} complete\n'
-        print(f'\r{line}', end='')
+            line = f'{self._frame(self.bar_width+1)} complete{self._tail}\n'
+            self._finished = True
+        self._write(f'\r{line}')
+        if self._finished:
+            self.sink.flush()
+
+    def _write(self, text: str) -> None:
+        """Write text to the sink"""
+        self.sink.write(text)
+
+
+class ChildBar:
+    __slots__ = ('parent', 'n_iters', 'weight', 'i', 'done', 'closed', '_scale', '_reported', '_partial', '_children')
+
+    def __init__(self, parent, n_iterations: int, weight: float = 1) -> None:
+        """
+        Sub-task of a ProgressBar or of another ChildBar, create it with parent.child(n_iterations, weight)
+        ---
+        params:
+            - parent: [ProgressBar or ChildBar] bar this sub-task is part of
+            - n_iterations: [int] number of iterations of the sub-task, None when unknown
+            - weight: [float] number of iterations of the parent the complete sub-task is worth
+        """
+        self.parent = parent
+        self.n_iters = n_iterations
+        self.weight = weight
+        self.i = 0
+        self.done = False
+        self.closed = False
+        self._scale = weight / n_iterations if n_iterations else 0.     # parent iterations per iteration
+        self._reported = 0.             # parent iterations reported so far, taken back when the child is folded
+        self._partial = 0.              # iterations contributed by the running children
+        self._children = []
+        parent._children.append(self)
+
+    def __call__(self) -> None:
+        """Wrapper for update function"""
+        self.update()
+
+    def __iter__(self):
+        """Iterate over range(n_iterations) while advancing the sub-task"""
+        if self.n_iters is None:
+            raise TypeError('Cannot iterate over a sub-task without a total, use wrap() to advance it over an iterable')
+        return self.wrap(range(self.n_iters))
+
+    def __enter__(self) -> 'ChildBar':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def update(self, n: int = 1) -> None:
+        """Update the sub-task by n iterations, its share goes straight up to the parent"""
+        if self.closed:
+            return
+        self.i += n
+        if self.n_iters is not None and self.i >= self.n_iters:
+            return self.close()
+        x = n * self._scale
+        self._reported += x
+        self.parent._add_partial(x)
+
+    def wrap(self, iterable):
+        """Yield the items of iterable, advancing the sub-task by one after every item, and close it afterwards"""
+        try:
+            for item in iterable:
+                yield item
+                self.update()
+        finally:
+            self.close()
+
+    def child(self, n_iterations: int, weight: float = 1) -> 'ChildBar':
+        """Create a sub-task of this sub-task, see ProgressBar.child"""
+        return ChildBar(self, n_iterations, weight)
+
+    def close(self) -> None:
+        """Finish the sub-task, the parent counts its full weight from now on (also when it was not complete)"""
+        if self.closed:
+            return
+        for child in self._children:
+            child._detach()
+        self._children = []
+        self.closed = True
+        self.done = self.n_iters is None or self.i >= self.n_iters
+        if self.n_iters is not None:
+            self.i = min(self.i, self.n_iters)
+        self.parent._finish_child(self)
+
+    def _detach(self) -> None:
+        """Stop reporting to the parent without being folded into it, the parent is closing"""
+        for child in self._children:
+            child._detach()
+        self._children = []
+        self.closed = True
+
+    def _add_partial(self, x: float) -> None:
+        """Add progress of a running child and pass its share on to the parent"""
+        if self.closed:
+            return
+        self._partial += x
+        x *= self._scale
+        self._reported += x
+        self.parent._add_partial(x)
+
+    def _finish_child(self, child: 'ChildBar') -> None:
+        """Replace the share a child reported so far by its full weight"""
+        if self.closed:
+            return
+        self._children.remove(child)
+        partial = self._partial - child._reported if self._children else 0.
+        x = (partial - self._partial) * self._scale
+        self._partial = partial
+        self._reported += x
+        self.parent._add_partial(x)
+        self.update(child.weight)
+
+
+def log_mode(log: bool, sink) -> bool:
+    """Decide between log lines and a redrawn bar: explicit choice, then PROGRESS_LOG, then whether sink is a terminal"""
+    if log is not None:
+        return log
+    env = os.environ.get('PROGRESS_LOG', '')
+    if env:
+        return env.lower() not in ['0', 'false', 'no', 'off']
+    return not sink.isatty()
+
+def _describe(children: list) -> str:
+    """Counts of running children and their own running children, for the suffix of the top-level bar"""
+    parts = []
+    for child in children:
+        parts.append(f' › {child.i}/{child.n_iters}' if child.n_iters is not None else f' › {child.i}')
+        if child._children:
+            parts.append(_describe(child._children))
+    return ''.join(parts)
+
+def _format_count(count: float, unit: str = 'it') -> str:
+    """Format a count of units with a k, M, G or T prefix"""
+    if count < 1000:
+        return f'{count:.0f} {unit}'
+    for prefix in ['k', 'M', 'G', 'T']:
+        count /= 1000
+        if count < 1000:
+            break
+    return f'{count:.3g} {prefix}{unit}'
+
+def _format_rate(rate: float, unit: str = 'it') -> str:
+    """Format units per second with a k, M, G or T prefix"""
+    if rate is None:
+        return f'? {unit}/s'
+    return f'{rate:.3g} {unit}/s' if rate < 1000 else f'{_format_count(rate, unit)}/s'
+
+def _format_time(seconds: float) -> str:
+    """Format seconds as [h:]mm:ss"""
+    if seconds is None:
+        return '--:--'
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}' if hours else f'{minutes:02}:{seconds:02}'
+
+def _run_chunk(fn, chunk: list) -> list:
+    """Apply fn to a chunk of items inside a pool worker"""
+    return [fn(item) for item in chunk]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+cross-process progress for a python progress bar
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+"""
+
+import os
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+from progress import ProgressBar
+
+class SharedCounter:
+    def __init__(self, slots: int = None, name: str = None, lock = None, mp_context = None) -> None:
+        """
+        Per process iteration counters in a named shared memory segment
+        ---
+        params:
+            - slots: [int] maximum number of processes that can claim a counter (defaults to 4 per cpu + 1)
+            - name: [str] name of an existing segment to attach to, a new segment is created when None
+            - lock: [multiprocessing.Lock] lock that guards claiming a slot (never taken for an update)
+            - mp_context: [multiprocessing context] context the lock is created in when lock is None, has to match
+                          the start method of the worker processes (ProcessPoolExecutor mp_context), the default
+                          context when None
+        ---
+        layout: int64 number of claimed slots, followed by one int64 counter per slot
+        """
+        self.owner = name is None
+        if slots is None:
+            slots = 4 * (os.cpu_count() or 1) + 1
+        self.slots = slots
+        if lock is None:
+            lock = (mp_context or multiprocessing.get_context()).Lock()
+        self.lock = lock
+        self.shm = SharedMemory(name=name, create=self.owner, size=8 * (slots + 1))
+        self.counts = self.shm.buf.cast('q')
+        if self.owner:
+            self.counts[0] = 0
+        self._slot = None
+        self.closed = False
+
+    @property
+    def handle(self) -> tuple:
+        """Arguments for attach(), meant to be passed as pool initargs"""
+        return (self.shm.name, self.slots, self.lock)
+
+    def claim(self) -> int:
+        """Reserve a slot for the calling process"""
+        with self.lock:
+            slot = self.counts[0] + 1
+            if slot > self.slots:
+                raise ValueError(f'All {self.slots} slots are claimed, create the counter with more slots')
+            self.counts[0] = slot
+        self._slot = slot
+        return slot
+
+    def advance(self, n: int = 1) -> None:
+        """Add n iterations to the slot of the calling process, a plain store in shared memory"""
+        if self._slot is None:
+            self.claim()
+        self.counts[self._slot] += n
+
+    def total(self) -> int:
+        """Sum the counters of all claimed slots"""
+        return sum(self.counts[1:self.counts[0]+1])
+
+    def close(self) -> None:
+        """Detach from the segment, the creating process also removes it, does nothing once closed"""
+        if self.closed:
+            return
+        self.closed = True
+        self.counts.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+_counter = None     # counter of the current (worker) process, set by attach
+
+def attach(name: str, slots: int, lock = None) -> SharedCounter:
+    """Attach the current process to a shared counter by name, use as pool initializer with counter.handle"""
+    global _counter
+    _counter = SharedCounter(slots, name, lock)
+    return _counter
+
+def advance(n: int = 1) -> None:
+    """Add n iterations to the counter this process attached to"""
+    _counter.advance(n)
+
+
+class SharedProgressBar(ProgressBar):
+    def __init__(self, n_iterations: int, slots: int = None, mp_context = None, **kwargs) -> None:
+        """
+        Progress bar that counts the iterations of worker processes through a SharedCounter
+        ---
+        params:
+            - n_iterations: [int] total number of iterations to be processed
+            - slots: [int] maximum number of processes that update the bar
+            - mp_context: [multiprocessing context] the one the worker processes are started with, see SharedCounter
+            - kwargs: any other ProgressBar parameter, rendering always happens in a thread of this process
+        ---
+        usage:
+            with SharedProgressBar(n) as bar:
+                with ProcessPoolExecutor(initializer=attach, initargs=bar.counter.handle) as pool:
+                    pool.map(work, items)   # work calls advance() once per item
+        """
+        self.counter = SharedCounter(slots, mp_context=mp_context)
+        kwargs['render'] = 'thread'
+        super().__init__(n_iterations, **kwargs)
+
+    def close(self) -> None:
+        """Draw the final frame and remove the shared segment, does nothing once closed"""
+        if self.counter.closed:
+            return                              # the final count is gone with the segment
+        super().close()
+        self.counter.close()
+
+    def _count(self, n: int = 1) -> None:
+        """Update the progress bar by n iterations from the rendering process"""
+        self.counter.advance(n)
+
+    def _collect(self) -> None:
+        """Sum the counters of all processes into the iteration count"""
+        self.i = self.counter.total()
+
+
+if __name__ == '__main__':
+    print('Do not run this file directly.')
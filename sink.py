@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+output sinks for a python progress bar
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+"""
+
+import os
+import sys
+from time import monotonic
+
+class Sink:
+    def __init__(self, frames: int = 1, interval: float = None) -> None:
+        """
+        Base class for the destinations a bar writes its frames to
+        ---
+        params:
+            - frames: [int] number of writes that are collected before they go out in one go
+            - interval: [float] number of seconds after which the buffered writes go out, None to only count
+                        frames, this is checked on a write so the last writes wait for the next one (or for flush,
+                        which the bar calls when it is closed)
+        ---
+        keeps track of the number of bytes (characters for a text stream) and the number of writes to the
+        underlying destination
+        """
+        self.frames = frames
+        self.interval = interval
+        self.bytes = 0                  # bytes handed to the destination, characters for a text stream
+        self.writes = 0                 # writes to the destination (syscalls for fd sinks)
+        self._buffer = []
+        self._since = None              # time of the oldest buffered write
+
+    def write(self, text: str) -> None:
+        """Buffer text and write it out when the flush policy says so"""
+        self._buffer.append(text)
+        if len(self._buffer) >= self.frames:
+            self.flush()
+        elif self.interval is not None:
+            now = monotonic()
+            if self._since is None:
+                self._since = now
+            elif now - self._since >= self.interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write out everything that is buffered"""
+        if self._buffer:
+            text = ''.join(self._buffer)
+            self._buffer.clear()
+            self._since = None
+            self._emit(text)
+
+    def isatty(self) -> bool:
+        """Whether the destination is an interactive terminal"""
+        return False
+
+    def terminal_size(self) -> os.terminal_size:
+        """Size of the terminal the destination is, None when it is no terminal"""
+        return None
+
+    def _emit(self, text: str) -> None:
+        raise NotImplementedError
+
+
+class StreamSink(Sink):
+    def __init__(self, stream, frames: int = 1, interval: float = None) -> None:
+        """Sink that writes to a text file object such as sys.stdout, sys.stderr or an opened file, counts characters"""
+        super().__init__(frames, interval)
+        self.stream = stream
+
+    def isatty(self) -> bool:
+        isatty = getattr(self.stream, 'isatty', None)
+        return isatty is not None and isatty()
+
+    def terminal_size(self) -> os.terminal_size:
+        try:
+            return os.get_terminal_size(self.stream.fileno())
+        except (AttributeError, ValueError, OSError):   # no file descriptor (StringIO, closed) or no terminal
+            return None
+
+    def _emit(self, text: str) -> None:
+        self.stream.write(text)
+        self.stream.flush()             # a frame that stays in the text buffer is never seen
+        self.bytes += len(text)         # the stream encodes, encoding again only to count is not worth it
+        self.writes += 1
+
+
+class FdSink(Sink):
+    def __init__(self, fd: int, frames: int = 1, interval: float = None, encoding: str = 'utf-8') -> None:
+        """Sink that writes encoded bytes straight to a file descriptor with os.write, bypassing the text layer"""
+        super().__init__(frames, interval)
+        self.fd = fd
+        self.encoding = encoding
+
+    def isatty(self) -> bool:
+        return os.isatty(self.fd)
+
+    def terminal_size(self) -> os.terminal_size:
+        try:
+            return os.get_terminal_size(self.fd)
+        except OSError:
+            return None
+
+    def _emit(self, text: str) -> None:
+        data = memoryview(text.encode(self.encoding))
+        while data:                     # os.write may write only part of the data
+            written = os.write(self.fd, data)
+            data = data[written:]
+            self.bytes += written
+            self.writes += 1
+
+
+class NullSink(Sink):
+    def __init__(self) -> None:
+        """Sink that discards everything, for measuring a bar without any terminal"""
+        super().__init__()
+
+    def write(self, text: str) -> None:
+        self.bytes += len(text.encode())
+
+    def _emit(self, text: str) -> None:
+        pass
+
+
+def get_sink(target = 'stdout', frames: int = 1, interval: float = None) -> Sink:
+    """
+    Resolve a sink from a name, file descriptor or file object
+    ---
+    params:
+        - target: {stdout, stderr, null}, an int file descriptor, a text file object or a Sink
+        - frames, interval: flush policy, see Sink
+    """
+    if isinstance(target, Sink):
+        return target
+    if target == 'stdout':
+        return StreamSink(sys.stdout, frames, interval)
+    if target == 'stderr':
+        return StreamSink(sys.stderr, frames, interval)
+    if target == 'null':
+        return NullSink()
+    if isinstance(target, int):
+        return FdSink(target, frames, interval)
+    if hasattr(target, 'write'):
+        return StreamSink(target, frames, interval)
+    raise ValueError(f'Invalid sink "{target}", choose stdout, stderr, null, a file descriptor or a file object')
+
+
+if __name__ == '__main__':
+    print('Do not run this file directly.')
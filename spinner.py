@@ -6,41 +6,132 @@ Initial commit: 08-05-2022
 Author: J.D. Hamelink
 """
 
+import ast # parsing frame lists from spinner files
+import os
+import re
+from time import monotonic
+from types import MappingProxyType
+
+from style import Style
+
+# frame sets by name, shared by all spinners, extended with register() and load()
+_REGISTRY = {
+    '':                         ('',),
+    'default':                  ('|', '/', '-', '\\'),
+
+    'quarter':                  ('▘', '▝', '▗', '▖'),
+    'inv_quarter':              ('▟', '▙', '▛', '▜'),
+    'half_box':                 ('◧', '◩', '◨', '◪'),
+    'clock':                    ('◴', '◷', '◶', '◵'),
+    'triangle_corners':         ('◸', '◹', '◿', '◺'),
+    'triangle_corners_filled':  ('◤', '◥', '◢', '◣'),
+    'quarter_box':              ('◰', '◳', '◲', '◱'),
+
+    'slider':                   ('╵', '╹', '╿', '╽', '╻', '╷', '╻', '╽', '╿', '╹'),
+    'horizontal_slider':        ('╴', '╸', '╾', '╼', '╺', '╶', '╺', '╼', '╾', '╸'),
+
+    'cross_slider':             ('╀', '╄', '┾', '╆', '╁', '╅', '┽', '╃'),
+    'dynamic_quarter':          ('▘', '▀', '▝', '▐', '▗', '▄', '▖', '▌'),
+    'horizontal_hourglass':     ('⧔', '⧑', '⧓', '⧒', '⧕', '⧒', '⧓', '⧑'),
+
+    'quarter_circle':           ('◜ ', ' ◝', ' ◞', '◟ '),
+
+    'wheel':                    ('⨁', '⨂'),
+}
+SPINNERS = MappingProxyType(_REGISTRY)      # read-only view, reflects registrations
+
+_LOADED = dict()    # absolute path -> names defined in that file, every file is parsed once
+_FRAMES_LINE_RE = re.compile(r'^\s*frames\s*=\s*(\[.*\])\s*#\s*(\w+)\s*$')
+
+def register(name: str, frames, replace: bool = False) -> None:
+    """
+    Add a set of frames to the spinner registry
+    ---
+    params:
+        - name: [str] name to use with Spinner(name) and ProgressBar.set_spinner(name)
+        - frames: [sequence] strings that are shown one after the other
+        - replace: [bool] set to True to overwrite a spinner that is already registered under name
+    """
+    frames = tuple(frames)
+    if not frames or not all(isinstance(frame, str) for frame in frames):
+        raise ValueError(f'Invalid frames for spinner "{name}", give a non-empty sequence of strings')
+    if name in _REGISTRY and not replace:
+        raise ValueError(f'Spinner "{name}" already exists, pass replace=True to overwrite it')
+    _REGISTRY[name] = frames
+
+def load(filename: str, replace: bool = False) -> list[str]:
+    """
+    Register all spinners defined in a file, a file is only read the first time it is loaded
+    ---
+    format (as in spinners.txt), one spinner per line, everything else is ignored:
+        frames = ['a', 'b', 'c']    # name
+    ---
+    names that are already registered are kept unless replace is True,
+    returns the names of all spinners defined in the file
+    """
+    path = os.path.abspath(filename)
+    if path in _LOADED:
+        return _LOADED[path]
+    names = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            match = _FRAMES_LINE_RE.match(line)
+            if match is None:
+                continue
+            frames, name = ast.literal_eval(match.group(1)), match.group(2)
+            if replace or name not in _REGISTRY:
+                register(name, frames, replace)
+            names.append(name)
+    _LOADED[path] = names
+    return names
+
+
 class Spinner:
-    def __init__(self, name: str = 'default'):
+    def __init__(self, name: str = 'default', color: str = None, bg_color: str = None, interval: float = None):
+        """
+        Spinner that cycles through a registered set of frames
+        ---
+        params:
+            - name: [str] name of a registered spinner, see help()
+            - color: [str] color to set the frames as
+            - bg_color: [str] color to set the backgrounds of the frames as
+            - interval: [float] number of seconds per frame, the frame then follows the clock instead of the
+                        number passed on every call
+        """
+        self.dictionary = SPINNERS
+        self.interval = interval
         self.frames = self._get_frames(name)
+        if color is not None or bg_color is not None:
+            self.frames = self._style_frames(self.frames, color, bg_color)
     
     def __call__(self, i: int = 0):
+        if self.interval:
+            i = self.phase()
         return self.frames[i%len(self.frames)]
 
-    def _get_frames(self, name: str = None) -> list[str]:
-        self.dictionary = {
-            '':                         [''],
-            'default':                  ['|', '/', '-', '\\'],
-
-            'quarter':                  ['▘', '▝', '▗', '▖'],
-            'inv_quarter':              ['▟', '▙', '▛', '▜'],
-            'half_box':                 ['◧', '◩', '◨', '◪'],
-            'clock':                    ['◴', '◷', '◶', '◵'],
-            'triangle_corners':         ['◸', '◹', '◿', '◺'],
-            'triangle_corners_filled':  ['◤', '◥', '◢', '◣'],
-            'quarter_box':              ['◰', '◳', '◲', '◱'],
+    def phase(self) -> int:
+        """Number of whole intervals on the clock, None when the spinner is not time based"""
+        if self.interval:
+            return int(monotonic() / self.interval)
+        return None
 
-            'slider':                   ['╵', '╹', '╿', '╽', '╻', '╷', '╻', '╽', '╿', '╹'],
-            'horizontal_slider':        ['╴', '╸', '╾', '╼', '╺', '╶', '╺', '╼', '╾', '╸'],
-
-            'cross_slider':             ['╀', '╄', '┾', '╆', '╁', '╅', '┽', '╃'],
-            'dynamic_quarter':          ['▘', '▀', '▝', '▐', '▗', '▄', '▖', '▌'],
-            'horizontal_hourglass':     ['⧔', '⧑', '⧓', '⧒', '⧕', '⧒', '⧓', '⧑'],
-
-            'quarter_circle':           ['◜ ', ' ◝', ' ◞', '◟ '],
-
-            'wheel':                    ['⨁', '⨂']
-        }
+    def _get_frames(self, name: str = None) -> tuple[str]:
         try:
-            return self.dictionary[name]
+            return SPINNERS[name]
         except KeyError:
             raise ValueError(f'Invalid spinner name "{name}", take a look at the Spinner().help() method')
+
+    def _style_frames(self, frames: tuple[str], color: str = None, bg_color: str = None) -> tuple[str]:
+        """Color all (non-empty) frames once, so that a call stays a lookup"""
+        S = Style()
+        styled = []
+        for frame in frames:
+            if frame and color is not None:
+                frame = S.set_color(color, frame)
+            if frame and bg_color is not None:
+                frame = S.set_bg_color(bg_color, frame)
+            styled.append(frame)
+        return tuple(styled)
     
     def help(self) -> None:
         print(f'These are all of the valid spinner names:\n\n{list(self.dictionary.keys())}')
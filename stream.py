@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+byte progress for file and stream I/O
+---
+Initial commit: 18-10-2026
+Author: J.D. Hamelink
+"""
+
+import errno
+import io
+import os
+import stat
+
+from progress import ProgressBar
+
+# errors that mean the kernel cannot copy between these two files, the copy then falls back to a buffer loop
+_NO_ZERO_COPY = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTSOCK}
+
+def remaining_size(f) -> int:
+    """Number of bytes between the position of f and the end of the file, None when f is not a regular file"""
+    try:
+        info = os.fstat(f.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            return None
+        return max(info.st_size - f.tell(), 0)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def _default_total(f) -> int:
+    """Number of bytes expected when reading f, None (no total) for a file that is written to or not seekable"""
+    try:
+        readable = f.readable()
+    except (AttributeError, ValueError):
+        return None
+    return remaining_size(f) if readable else None
+
+
+class ProgressFile:
+    def __init__(self, f, bar: ProgressBar = None, total: int = None, **kwargs) -> None:
+        """
+        File-like proxy that advances a bar by the number of bytes read or written through it
+        ---
+        params:
+            - f: [file object] binary file or stream to wrap, everything else is passed through to it
+            - bar: [ProgressBar] bar to advance, one is created (and closed with the proxy) when None
+            - total: [int] number of bytes expected, by default the remaining size of f if it is a regular file
+                     opened for reading, otherwise there is no total
+            - kwargs: ProgressBar parameters for the bar that is created
+        ---
+        read, readinto and write pass the data through untouched, only the byte counts reach the bar
+        """
+        self.f = f
+        self._owns_bar = bar is None
+        if bar is None:
+            bar = ProgressBar(total if total is not None else _default_total(f), **dict(dict(unit='B'), **kwargs))
+        self.bar = bar
+        self._advance = bar.update
+
+    def __getattr__(self, name: str):
+        return getattr(self.f, name)
+
+    def __enter__(self) -> 'ProgressFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __iter__(self):
+        for line in self.f:
+            self._advance(len(line))
+            yield line
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        if data:
+            self._advance(len(data))
+        return data
+
+    def read1(self, size: int = -1) -> bytes:
+        data = self.f.read1(size)
+        if data:
+            self._advance(len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        n = self.f.readinto(buffer)
+        if n:
+            self._advance(n)
+        return n
+
+    def readline(self, size: int = -1) -> bytes:
+        line = self.f.readline(size)
+        if line:
+            self._advance(len(line))
+        return line
+
+    def write(self, data) -> int:
+        n = self.f.write(data)
+        self._advance(len(data) if n is None else n)
+        return n
+
+    def close(self) -> None:
+        """Close the wrapped file and the bar (if it was created by the proxy)"""
+        if self._owns_bar:
+            self.bar.close()
+        self.f.close()
+
+
+def copy(src, dst, buffer_size: int = 1 << 20, bar: ProgressBar = None, total: int = None, **kwargs) -> int:
+    """
+    Copy all bytes from src (from its position) to dst while a bar tracks the number of bytes copied
+    ---
+    params:
+        - src, dst: [file object or path] binary files, paths are opened (and closed) by the copy
+        - buffer_size: [int] number of bytes per kernel copy call or buffer fill
+        - bar: [ProgressBar] bar to advance, one is created (and closed) when None
+        - total: [int] number of bytes expected, by default the remaining size of src if it is a regular file
+        - kwargs: ProgressBar parameters for the bar that is created
+    ---
+    between two files the kernel copies directly (copy_file_range, then sendfile), otherwise one
+    preallocated buffer is filled with readinto and written out through a memoryview, so the bar
+    adds no copies of its own. Returns the number of bytes copied.
+    """
+    opened = []
+    if isinstance(src, (str, os.PathLike)):
+        src = open(src, 'rb')
+        opened.append(src)
+    if isinstance(dst, (str, os.PathLike)):
+        dst = open(dst, 'wb')
+        opened.append(dst)
+    try:
+        owns_bar = bar is None
+        if bar is None:
+            bar = ProgressBar(total if total is not None else _default_total(src), **dict(dict(unit='B'), **kwargs))
+        try:
+            copied = _copy_zero(src, dst, buffer_size, bar.update)
+            if copied is None:
+                copied = _copy_buffered(src, dst, buffer_size, bar.update)
+        finally:
+            if owns_bar:
+                bar.close()
+        return copied
+    finally:
+        for f in opened:
+            f.close()
+
+def _copy_zero(src, dst, buffer_size: int, advance) -> int:
+    """Let the kernel copy between two file descriptors, None when that is not possible before anything is copied"""
+    if remaining_size(src) is None:
+        return None
+    try:
+        in_fd, out_fd = src.fileno(), dst.fileno()
+        position = src.tell()                   # file objects may have read ahead, so pass explicit offsets
+        dst.flush()                             # everything written so far has to be in the file first
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+    methods = []
+    if hasattr(os, 'copy_file_range'):
+        methods.append(lambda offset: os.copy_file_range(in_fd, out_fd, buffer_size, offset))
+    if hasattr(os, 'sendfile'):
+        methods.append(lambda offset: os.sendfile(out_fd, in_fd, offset, buffer_size))
+    for method in methods:
+        copied = 0
+        try:
+            while True:
+                n = method(position + copied)
+                if n == 0:
+                    break
+                copied += n
+                advance(n)
+        except OSError as e:
+            if copied or e.errno not in _NO_ZERO_COPY:
+                raise
+            continue                            # not supported for these files, try the next method
+        src.seek(position + copied)             # the file object did not see the copy, move it along
+        if dst.seekable():                      # same for dst, whose descriptor position was advanced by the kernel
+            dst.seek(os.lseek(out_fd, 0, os.SEEK_CUR))
+        return copied
+    return None
+
+def _copy_buffered(src, dst, buffer_size: int, advance) -> int:
+    """Copy through one reusable buffer"""
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+    readinto = getattr(src, 'readinto', None)
+    while True:
+        if readinto is not None:
+            n = readinto(buffer)
+            if not n:
+                break
+            dst.write(view[:n])
+        else:
+            data = src.read(buffer_size)
+            if not data:
+                break
+            n = len(data)
+            dst.write(data)
+        copied += n
+        advance(n)
+    return copied
+
+
+if __name__ == '__main__':
+    print('Do not run this file directly.')
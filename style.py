@@ -7,69 +7,113 @@ Author: J.D. Hamelink
 """
 
 import re # stripping styles from strings
+from functools import lru_cache
+from types import MappingProxyType
+
+RESET = '\033[0m'
+
+# base color codes (fg, bg), bright variants are derived by adding 60 to both
+_BASE_COLORS = (
+    ('black',   30, 40),
+    ('red',     31, 41),
+    ('green',   32, 42),
+    ('yellow',  33, 43),
+    ('blue',    34, 44),
+    ('magenta', 35, 45),
+    ('cyan',    36, 46),
+    ('white',   37, 47),
+)
+
+def _build_colors() -> dict:
+    """Build the color table (name -> fg code, bg code) including bright variants"""
+    c = dict()
+    for name, fg, bg in _BASE_COLORS:
+        c[name] = (str(fg), str(bg))
+    for name, fg, bg in _BASE_COLORS:
+        c['bright_'+name] = (str(fg+60), str(bg+60))
+    return c
+
+COLORS = MappingProxyType(_build_colors())                                  # process-wide, read-only
+FG = MappingProxyType({name: f'\033[{fg}m' for name, (fg, _) in COLORS.items()})  # prebuilt escape prefixes
+BG = MappingProxyType({name: f'\033[{bg}m' for name, (_, bg) in COLORS.items()})  # ""
+
+_ORIGINAL_RE = re.compile('\033\\[(?:[0-5]|[349][0-7]|10[0-7])m')   # 0-5, 30-37, 40-47, 90-97, 100-107
+_ALL_COLORS_RE = re.compile('\033\\[(?:0|[349][0-7]|10[0-7])m')     # 0, 30-37, 40-47, 90-97, 100-107
+_FG_COLOR_RE = re.compile('\033\\[[39][0-7]m')                      # 30-37, 90-97
+_BG_COLOR_RE = re.compile('\033\\[(?:4[0-7]|10[0-7])m')             # 40-47, 100-107
+_ESCAPE_RE = re.compile('\033\\[[0-9;]*m')                          # any escape sequence
+
+@lru_cache(maxsize=4096)
+def _restyle(prefix: str, strip: re.Pattern, char: str) -> str:
+    """Strip a kind of styling from a character and wrap it in a new prefix, memoized"""
+    return f'{prefix}{strip.sub("", char)}{RESET}'
+
+@lru_cache(maxsize=4096)
+def _original(string: str) -> str:
+    """Remove all font effects and coloring from a string, memoized"""
+    return _ORIGINAL_RE.sub('', string)
 
 class Style:
     def __init__(self):
-        style_file = 'style.txt'
-        self.c = self.load_base_colors(style_file)
+        self.c = COLORS
 
     def set_color(self, color: str, char: str = None) -> str:
         """Set the color of a character (base, head, todo or brace)"""
-        if color not in set(self.c.keys()):
+        if color not in COLORS:
             raise ValueError(f'Invalid color "{color}", look at the README to see all available colors') # TODO actually write README
-        return getattr(self, color)(self.strip_fg_color(char))
+        return _restyle(FG[color], _FG_COLOR_RE, char)
     
     def set_bg_color(self, color: str, char: str = None):
         """Set the background color of a character (base, head, todo or brace)"""
-        if color not in set(self.c.keys()):
+        if color not in COLORS:
             raise ValueError(f'Invalid background color "{color}", look at the README to see all available colors') # TODO actually write README
-        bg_color = color+'_bg'
-        return getattr(self, bg_color)(self.strip_bg_color(char))
+        return _restyle(BG[color], _BG_COLOR_RE, char)
 
     def get_original(self, string: str) -> str:
         """Remove all font effects and coloring from a string to get the original"""
-        for color_code in re.findall('[0-5]|[349][0-7]|10[0-7]', string):   # 0-5, 30-37, 40-47, 90-97, 100-107
-            string = string.replace(f'\033[{color_code}m', '')
-        return string 
+        return _original(string)
     
     def strip_all_colors(self, string: str) -> str:
         """Remove all coloring of a string"""
-        for color_code in re.findall('0|[349][0-7]|10[0-7]', string):       # 0, 30-37, 40-47, 90-97, 100-107
-            string = string.replace(f'\033[{color_code}m', '')
-        return string
+        return _ALL_COLORS_RE.sub('', string)
     
     def strip_fg_color(self, string: str) -> str:
         """Remove all foreground coloring of a string"""
-        for color_code in re.findall('[39][0-7]', string):                  # 30-37, 90-97
-            string = string.replace(f'\033[{color_code}m', '')
-        return string
+        return _FG_COLOR_RE.sub('', string)
     
     def strip_bg_color(self, string: str) -> str:
         """Remove all background coloring of a string"""
-        for color_code in re.findall('4[0-7]|10[0-7]', string):             # 40-47, 100-107
-            string = string.replace(f'\033[{color_code}m', '')
-        return string
-
-    def load_base_colors(self, filename: str) -> dict:
-        """Read all base color codes (just numbers) from given .txt file"""
-        c = dict()
-
-        # Add basic color numbers (fg and bg) to the color dict
-        with open(filename) as f:
-            f.readline()    # skip header
-            for line in f.readlines():
-                name, fg, bg = line.strip().split(',')
-                c.update({name: (fg, bg)})
-        
-        # Add bright color numbers (fg and bg) to the color dict
-        with open(filename) as f:
-            f.readline()    # skip header
-            for line in f.readlines():
-                name, fg, bg = line.strip().split(',')
-                b_name, b_fg, b_bg = 'bright_'+name, str(int(fg)+60), str(int(bg)+60)
-                c.update({b_name: (b_fg, b_bg)})
-
-        return c
+        return _BG_COLOR_RE.sub('', string)
+
+    def split_style(self, char: str) -> tuple[str, str]:
+        """Split a styled character into the escape prefix that is active on it and the original character"""
+        prefix = ''.join(code for code in _ESCAPE_RE.findall(char) if code != RESET)
+        return prefix, self.get_original(char)
+
+    def join_runs(self, runs: list[tuple[str, int]]) -> str:
+        """
+        Join runs of repeated styled characters, emitting every distinct style prefix once per run
+        ---
+        params:
+            - runs: [list] (styled character, count) pairs in the order they should appear
+        ---
+        renders the same as concatenating count * character for every run, but without
+        a prefix and a reset for every single character
+        """
+        out, active = [], ''
+        for char, count in runs:
+            if count <= 0:
+                continue
+            prefix, original = self.split_style(char)
+            if prefix != active:
+                if active:
+                    out.append(RESET)           # style codes are additive, so clear the previous run first
+                out.append(prefix)
+                active = prefix
+            out.append(count * original)
+        if active:
+            out.append(RESET)
+        return ''.join(out)
 
     # font functions
     if True: # make block collapsable in an IDE
@@ -88,105 +132,17 @@ class Style:
         def blink(self, string: str) -> str:
             return f'\033[5m{string}\033[0m'
 
-    # fg coloring functions
-    if True: # make block collapsable in an IDE
-        def black(self, string: str) -> str:
-            return f"\033[{self.c['black'][0]}m{string}\033[0m"
-
-        def red(self, string: str) -> str:
-            return f"\033[{self.c['red'][0]}m{string}\033[0m"
-
-        def green(self, string: str) -> str:
-            return f"\033[{self.c['green'][0]}m{string}\033[0m"
-
-        def yellow(self, string: str) -> str:
-            return f"\033[{self.c['yellow'][0]}m{string}\033[0m"
-
-        def blue(self, string: str) -> str:
-            return f"\033[{self.c['blue'][0]}m{string}\033[0m"
-
-        def magenta(self, string: str) -> str:
-            return f"\033[{self.c['magenta'][0]}m{string}\033[0m"
-
-        def cyan(self, string: str) -> str:
-            return f"\033[{self.c['cyan'][0]}m{string}\033[0m"
-
-        def white(self, string: str) -> str:
-            return f"\033[{self.c['white'][0]}m{string}\033[0m"
-
-        def bright_black(self, string: str) -> str:
-            return f"\033[{self.c['bright_black'][0]}m{string}\033[0m"
-
-        def bright_red(self, string: str) -> str:
-            return f"\033[{self.c['bright_red'][0]}m{string}\033[0m"
-
-        def bright_green(self, string: str) -> str:
-            return f"\033[{self.c['bright_green'][0]}m{string}\033[0m"
-
-        def bright_yellow(self, string: str) -> str:
-            return f"\033[{self.c['bright_yellow'][0]}m{string}\033[0m"
-
-        def bright_blue(self, string: str) -> str:
-            return f"\033[{self.c['bright_blue'][0]}m{string}\033[0m"
-
-        def bright_magenta(self, string: str) -> str:
-            return f"\033[{self.c['bright_magenta'][0]}m{string}\033[0m"
-
-        def bright_cyan(self, string: str) -> str:
-            return f"\033[{self.c['bright_cyan'][0]}m{string}\033[0m"
-
-        def bright_white(self, string: str) -> str:
-            return f"\033[{self.c['bright_white'][0]}m{string}\033[0m"
-
-    # bg coloring functions
-    if True: # make block collapsable in an IDE
-        def black_bg(self, string: str) -> str:
-            return f"\033[{self.c['black'][1]}m{string}\033[0m"
-
-        def red_bg(self, string: str) -> str:
-            return f"\033[{self.c['red'][1]}m{string}\033[0m"
-
-        def green_bg(self, string: str) -> str:
-            return f"\033[{self.c['green'][1]}m{string}\033[0m"
-
-        def yellow_bg(self, string: str) -> str:
-            return f"\033[{self.c['yellow'][1]}m{string}\033[0m"
-
-        def blue_bg(self, string: str) -> str:
-            return f"\033[{self.c['blue'][1]}m{string}\033[0m"
-
-        def magenta_bg(self, string: str) -> str:
-            return f"\033[{self.c['magenta'][1]}m{string}\033[0m"
-
-        def cyan_bg(self, string: str) -> str:
-            return f"\033[{self.c['cyan'][1]}m{string}\033[0m"
-
-        def white_bg(self, string: str) -> str:
-            return f"\033[{self.c['white'][1]}m{string}\033[0m"
-
-        def bright_black_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_black'][1]}m{string}\033[0m"
-
-        def bright_red_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_red'][1]}m{string}\033[0m"
-
-        def bright_green_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_green'][1]}m{string}\033[0m"
-
-        def bright_yellow_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_yellow'][1]}m{string}\033[0m"
-
-        def bright_blue_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_blue'][1]}m{string}\033[0m"
-
-        def bright_magenta_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_magenta'][1]}m{string}\033[0m"
 
-        def bright_cyan_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_cyan'][1]}m{string}\033[0m"
+def _painter(prefix: str):
+    """Make a Style method that wraps a string in the given escape prefix and a reset"""
+    def paint(self, string: str) -> str:
+        return f'{prefix}{string}{RESET}'
+    return paint
 
-        def bright_white_bg(self, string: str) -> str:
-            return f"\033[{self.c['bright_white'][1]}m{string}\033[0m"
+# fg and bg coloring functions (black, red_bg, bright_cyan, ...) are generated from the color table
+for _name in COLORS:
+    setattr(Style, _name, _painter(FG[_name]))
+    setattr(Style, _name+'_bg', _painter(BG[_name]))
 
 
 if __name__ == '__main__':
@@ -7,6 +7,23 @@ Author: J.D. Hamelink
 """
 
 from progress import ProgressBar
+import spinner
+from bench import measure_update
+from shared import SharedProgressBar, attach, advance
+from aio import AsyncProgressBar
+from multi import MultiProgress
+from sink import FdSink, NullSink
+from stream import ProgressFile, copy
+from export import read_status, watch
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import asyncio
+from threading import Thread
 from time import sleep, time
 
 def main():
@@ -15,7 +32,24 @@ def main():
     test_default(total_computations, computation_time)
     test_custom(total_computations, computation_time)
     test_preset(total_computations, computation_time)
-    test_overhead(total_computations, computation_time)
+    test_throttle(total_computations)
+    test_coalesce(total_computations, computation_time)
+    test_thread(total_computations, computation_time)
+    test_contention(total_computations)
+    test_processes(total_computations, computation_time)
+    test_map(total_computations, computation_time)
+    asyncio.run(test_async(total_computations, computation_time))
+    test_multi(total_computations, computation_time)
+    test_sinks(total_computations, computation_time)
+    test_incremental(total_computations, computation_time)
+    test_batched(total_computations, computation_time)
+    test_stats(total_computations, computation_time)
+    test_log(total_computations, computation_time)
+    test_spinners(total_computations, computation_time)
+    test_stream(total_computations)
+    test_export(total_computations, computation_time)
+    test_nested(total_computations, computation_time)
+    test_overhead(total_computations)
 
 def run(bar, total_computations, computation_time):
     for _ in range(total_computations):
@@ -57,29 +91,341 @@ def test_preset(total_computations, computation_time):
     print('preset: oldschool')
     run(bar2, total_computations, computation_time)
 
-def test_overhead(total_computations, computation_time):
+def test_throttle(total_computations):
+    n_iters = 200 * total_computations
+    print(f'throttled redraws (no sleep, {n_iters} iterations, at most one frame per 0.05 sec)')
+    bar = ProgressBar(n_iters, min_interval=0.05)
+    start = time()
+    for _ in range(n_iters):
+        bar()
+    print(f'{(time() - start) / n_iters * 1e9:.0f} ns per update')
 
-    def run_with(total_computations: int, computation_time: float) -> float:
-        start = time()
-        bar = ProgressBar(total_computations)
-        for _ in range(total_computations):
-            bar()
-            sleep(computation_time)
-        end = time()
-        return end - start
-    
-    def run_without(total_computations: int, computation_time: float) -> float:
-        start = time()
-        # place for bar initialization
-        for _ in range(total_computations):
-            # place for bar updating
+def test_coalesce(total_computations, computation_time):
+    bar = ProgressBar(total_computations, preset = 'minimal', coalesce=True)
+    print('preset: minimal, coalesced escape sequences')
+    run(bar, total_computations, computation_time)
+
+def test_thread(total_computations, computation_time):
+    print('render thread, refreshing every 0.05 sec')
+    with ProgressBar(total_computations, render='thread', refresh=0.05) as bar:
+        run(bar, total_computations, computation_time)
+
+    print('render thread, interrupted halfway')
+    with ProgressBar(total_computations, render='thread', refresh=0.05) as bar:
+        run(bar, total_computations // 2, computation_time)
+
+    print('render thread, never closed')
+    script = f'from progress import ProgressBar\nbar = ProgressBar({total_computations}, render="thread", log=True)\n' \
+             f'for _ in range({total_computations}): bar()\n'
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    assert 'complete' in output, 'the final frame was not drawn at exit'
+
+def test_contention(total_computations):
+    total_updates = 1000 * total_computations
+    timings = dict()
+    for n_threads in [1, 4, 16, 64]:
+        print(f'{n_threads} threads updating a shared bar')
+        per_thread = total_updates // n_threads
+        with ProgressBar(n_threads * per_thread, threads=True) as bar:
+            def work():
+                for _ in range(per_thread):
+                    bar()
+            workers = [Thread(target=work) for _ in range(n_threads)]
+            start = time()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            timings[n_threads] = (time() - start) / (n_threads * per_thread)
+        assert bar.i == n_threads * per_thread, f'lost updates: {bar.i} != {n_threads * per_thread}'
+    for n_threads, timing in timings.items():
+        print(f'{n_threads:>2} threads: {timing * 1e9:.0f} ns per update')
+
+def compute(computation_time):
+    sleep(computation_time)
+    advance()
+
+def test_processes(total_computations, computation_time):
+    print('worker processes updating a shared memory bar')
+    with SharedProgressBar(total_computations, refresh=0.05) as bar:
+        with ProcessPoolExecutor(4, initializer=attach, initargs=bar.counter.handle) as pool:
+            list(pool.map(compute, [computation_time] * total_computations))
+    assert bar.i == total_computations, f'lost updates: {bar.i} != {total_computations}'
+
+    print('shared memory bar wrapping an iterable in a with block')
+    with SharedProgressBar(total_computations, refresh=0.05) as bar:
+        for _ in bar.wrap(range(total_computations)):   # closed by wrap and again by the with block
+            pass
+    assert bar.i == total_computations, f'lost updates: {bar.i} != {total_computations}'
+
+    print('spawned worker processes updating a shared memory bar')
+    context = get_context('spawn')
+    with SharedProgressBar(total_computations, refresh=0.05, mp_context=context) as bar:
+        with ProcessPoolExecutor(4, mp_context=context, initializer=attach, initargs=bar.counter.handle) as pool:
+            list(pool.map(compute, [computation_time] * total_computations))
+    assert bar.i == total_computations, f'lost updates: {bar.i} != {total_computations}'
+
+def square(x):
+    return x * x
+
+def test_map(total_computations, computation_time):
+    print('parallel map over a thread pool, ordered')
+    def slow_square(x):
+        sleep(computation_time)
+        return x * x
+    results = list(ProgressBar.map(slow_square, range(total_computations), workers=8))
+    assert results == [x * x for x in range(total_computations)]
+
+    print('parallel map over a process pool, unordered, chunks of 64')
+    results = ProgressBar.map(square, range(100 * total_computations), executor='process', chunksize=64, ordered=False)
+    assert sorted(results) == [x * x for x in range(100 * total_computations)]
+
+    print('parallel map over a generator, left early')
+    consumed = []
+    def source():
+        for i in range(100 * total_computations):
+            consumed.append(i)
+            yield i
+    start = time()
+    for result in ProgressBar.map(slow_square, source(), workers=4):
+        if result >= 25:
+            break
+    assert len(consumed) < 100 * total_computations     # only a window of chunks was taken from the generator
+    assert time() - start < 100 * computation_time      # and the chunks that did not start were cancelled
+
+async def test_async(total_computations, computation_time):
+    async def source():
+        for i in range(total_computations):
+            await asyncio.sleep(computation_time)
+            yield i
+
+    async def task(i):
+        await asyncio.sleep(computation_time * (i % 10))
+        return i
+
+    print('async iterator')
+    async with AsyncProgressBar(total_computations, refresh=0.05) as bar:
+        async for _ in bar.wrap(source()):
+            pass
+
+    print('async gather')
+    async with AsyncProgressBar(total_computations, refresh=0.05, preset='minimal') as bar:
+        results = await bar.gather(*(task(i) for i in range(total_computations)))
+    assert results == list(range(total_computations))
+
+def test_multi(total_computations, computation_time):
+    print('three stacked bars, the middle one is removed halfway')
+    with MultiProgress() as multi:
+        bars = [multi.add(total_computations // k, preset=preset) for k, preset in [(1, None), (2, 'minimal'), (4, 'oldschool')]]
+        for i in range(total_computations):
+            for bar in bars:
+                if i < bar.n_iters:
+                    bar()
+            if i == total_computations // 2:
+                multi.remove(bars[1])
             sleep(computation_time)
-        end = time()
-        return end - start
 
+def test_sinks(total_computations, computation_time):
+    print('bar on stderr')
+    bar = ProgressBar(total_computations, sink='stderr')
+    run(bar, total_computations, computation_time)
+
+    n_iters = 100 * total_computations
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    sinks = {
+        'null': NullSink(),
+        'fd, every frame': FdSink(devnull),
+        'fd, 16 frames per write': FdSink(devnull, frames=16),
+        'fd, every 0.01 sec': FdSink(devnull, frames=n_iters, interval=0.01),
+    }
+    for name, sink in sinks.items():
+        with ProgressBar(n_iters, preset='minimal', sink=sink, log=False) as bar:
+            for _ in range(n_iters):
+                bar()
+        print(f'{name:>24}: {sink.bytes} bytes in {sink.writes} writes')
+
+    sink = FdSink(devnull, frames=16)
+    with ProgressBar(n_iters, preset='minimal', sink=sink, log=False) as bar:
+        for _ in range(n_iters // 2):
+            bar()
+    assert not sink._buffer, f'{len(sink._buffer)} writes left in the buffer of an interrupted bar'
+    os.close(devnull)
+
+def test_incremental(total_computations, computation_time):
+    print('incremental frames, with a message halfway')
+    bar = ProgressBar(total_computations, preset='minimal', incremental=True)
+    for i in range(total_computations):
+        bar()
+        if i == total_computations // 2:
+            bar.write('halfway there')
+        sleep(computation_time)
+
+    for incremental in [False, True]:
+        sink = NullSink()
+        with ProgressBar(total_computations, preset='minimal', incremental=incremental, sink=sink, log=False) as bar:
+            for _ in range(total_computations):
+                bar()
+        print(f'{incremental = }: {sink.bytes} bytes')
+
+def test_batched(total_computations, computation_time):
+    print('iterating over the bar')
+    for _ in ProgressBar(total_computations):
+        sleep(computation_time)
+
+    print('wrapping an iterable')
+    bar = ProgressBar(total_computations, preset='minimal')
+    for _ in bar.wrap(range(total_computations)):
+        sleep(computation_time)
+
+    print('chunks of 64, overshooting the total')
+    chunk = 64
+    with ProgressBar(total_computations) as bar:
+        for _ in range(0, total_computations + chunk, chunk):
+            bar.update(chunk)
+            sleep(chunk * computation_time / 10)
+    assert bar.done and bar.i == total_computations
+
+    print('nothing to do')
+    for _ in ProgressBar(0):
+        pass
+    with ProgressBar(len([])) as bar:
+        pass
+    assert bar.done
+
+def test_stats(total_computations, computation_time):
+    print('rate and ETA in the suffix')
+    with ProgressBar(total_computations, rate=True) as bar:
+        run(bar, total_computations, computation_time)
+    stats = bar.stats()
+    print(f"{stats['renders']} renders, {stats['average_compose_time'] * 1e6:.1f} us composing and "
+          f"{stats['average_render_time'] * 1e6:.1f} us writing per render, {100 * stats['overhead']:.3f}% overhead")
+
+def test_log(total_computations, computation_time):
+    print('log lines every 25%')
+    bar = ProgressBar(total_computations, log=True, log_every=25)
+    run(bar, total_computations, computation_time)
+
+    print('log lines every 0.5 sec')
+    bar = ProgressBar(total_computations, log=True, log_every=None, log_interval=0.5)
+    run(bar, total_computations, computation_time)
+
+def test_spinners(total_computations, computation_time):
+    spinner.load('spinners.txt')
+    spinner.register('arrows', '←↖↑↗→↘↓↙', replace=True)
+
+    print('colored spinner loaded from spinners.txt')
+    bar = ProgressBar(total_computations, log=False)
+    bar.set_spinner('vertical_slider', color='cyan')
+    run(bar, total_computations, computation_time)
+
+    print('registered spinner following the clock, drawn by the render thread')
+    with ProgressBar(total_computations, log=False, render='thread', refresh=0.05, spin_interval=0.1) as bar:
+        bar.set_spinner('arrows', color='yellow')
+        run(bar, total_computations, computation_time)
+
+def test_stream(total_computations):
+    size = 20_000 * total_computations
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'source')
+        with open(source, 'wb') as f:
+            f.write(os.urandom(size))
+
+        print(f'copying {size} bytes, kernel copy and buffered copy')
+        copied = copy(source, os.path.join(directory, 'copy'), buffer_size=1 << 16)
+        assert copied == size
+        with open(source, 'rb') as src, open(os.path.join(directory, 'copy'), 'rb') as dst:
+            assert src.read() == dst.read()
+        buffer = io.BytesIO()
+        assert copy(source, buffer, buffer_size=1 << 16) == size == len(buffer.getvalue())
+
+        print('copying an empty file and writing a new one')
+        empty = os.path.join(directory, 'empty')
+        open(empty, 'wb').close()
+        assert copy(empty, os.path.join(directory, 'empty copy')) == 0
+        with ProgressFile(open(os.path.join(directory, 'new'), 'wb')) as f:
+            f.write(bytes(size // 10))
+        assert f.bar.n_iters is None and f.bar.i == size // 10
+
+        print('reading a pipe of unknown size')
+        read_fd, write_fd = os.pipe()
+        def produce():
+            with open(write_fd, 'wb') as f:
+                for _ in range(total_computations):
+                    f.write(bytes(size // total_computations))
+                    sleep(0.002)
+        producer = Thread(target=produce)
+        producer.start()
+        with ProgressFile(open(read_fd, 'rb'), min_interval=0.05) as f:
+            while f.read(1 << 16):
+                pass
+        producer.join()
+        assert f.bar.i == size
+
+def test_export(total_computations, computation_time):
+    print('two bars that draw nothing, watched through their status files')
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f'job{k}.status') for k in range(2)]
+        def job(path, n_iters):
+            with ProgressBar(n_iters, render='off', export=path) as bar:
+                run(bar, n_iters, computation_time)
+        jobs = [Thread(target=job, args=(path, total_computations // (k + 1))) for k, path in enumerate(paths)]
+        for worker in jobs:
+            worker.start()
+        watch(paths, interval=0.05)
+        for worker in jobs:
+            worker.join()
+        status = read_status(paths[0])
+        assert status['done'] and status['i'] == total_computations, status
+
+        print('a status file left over from the previous run, watched until the next run rewrites it')
+        def rerun():
+            sleep(0.2)
+            job(paths[1], total_computations // 5)
+        worker = Thread(target=rerun)
+        worker.start()
+        watch(paths[1:], interval=0.05)
+        worker.join()
+        status = read_status(paths[1])
+        assert status['done'] and status['i'] == total_computations // 5, status
+
+        print('an exporter that dies halfway')
+        script = f'import os\nfrom progress import ProgressBar\n' \
+                 f'bar = ProgressBar({total_computations}, render="off", export={paths[0]!r})\n' \
+                 f'bar.update({total_computations // 2})\nos._exit(0)\n'
+        def crash():
+            sleep(0.2)                          # starts after the watch, so the file is not taken as left over
+            subprocess.run([sys.executable, '-c', script], check=True)
+        worker = Thread(target=crash)
+        worker.start()
+        watch(paths[:1], interval=0.05)
+        worker.join()
+        status = read_status(paths[0])
+        assert not status['closed'] and status['i'] < total_computations, status
+
+def test_nested(total_computations, computation_time):
+    print('epochs, batches and items in one bar, the last epoch weighs double')
+    n_epochs, n_batches = 4, 10
+    with ProgressBar(n_epochs + 1, log=False) as bar:
+        for epoch in range(n_epochs):
+            batches = bar.child(n_batches, weight=2 if epoch == n_epochs - 1 else 1)
+            for _ in range(n_batches):
+                for _ in batches.child(total_computations // (n_epochs * n_batches)):
+                    sleep(computation_time)
+    assert bar.done and not bar._children
+
+    print('many short-lived sub-tasks')
+    with ProgressBar(10 * total_computations, preset='minimal', log=False) as bar:
+        for _ in range(10 * total_computations):
+            with bar.child(8) as task:
+                for _ in range(8):
+                    task()
+    assert bar.i == 10 * total_computations and bar._partial == 0
+
+def test_overhead(total_computations):
     print('calculating overhead...')
-    overhead = run_with(total_computations, computation_time) - run_without(total_computations, computation_time)    
-    print(f'{overhead = :.4f} sec')
+    result = measure_update(number=100 * total_computations)
+    print(f"{result['median']:.0f} ns per update (min {result['min']:.0f}, stdev {result['stdev']:.0f}, "
+          f"{result['repeat']} runs), run bench.py for the full suite")
 
 
 if __name__ == '__main__':